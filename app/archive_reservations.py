@@ -0,0 +1,55 @@
+"""Archiva las reservaciones de meses pasados en segmentos gzip por mes.
+
+Mueve de reservations.csv a reservations_archive/AAAA-MM.csv.gz las
+reservaciones con fecha anterior al mes actual menos `--months` meses y
+compacta el CSV activo sin ellas. Siguen apareciendo en
+/reservations/user/{user_id}?include_archived=true, en
+/reservations/{court_id}/{date} (que abre solo el segmento de ese mes) y en
+/stats/courts (por sus totales diarios).
+
+Se ejecuta en el directorio de datos de main.py, con el servidor detenido o
+con WEB_WORKERS > 1: en ese modo los workers notan el CSV compactado y
+recargan; un servidor de un solo proceso no lo notaría hasta reiniciar.
+
+Uso: python archive_reservations.py [--months 6]
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def cutoff_month(today: date, months: int) -> str:
+    """Primer mes que se conserva en el CSV activo (AAAA-MM)"""
+    index = today.year * 12 + today.month - 1 - months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiva reservaciones de meses pasados")
+    parser.add_argument("--months", type=int, default=6,
+                        help="meses completos (además del actual) que se quedan en el CSV activo")
+    args = parser.parse_args()
+    if args.months < 1:
+        parser.error("--months debe ser al menos 1")
+
+    import main as api
+    from reservation_store import ReservationStore
+
+    if api.database:
+        print("ℹ️  Con STORAGE_BACKEND=sqlite no se archiva: la tabla tiene índices por fecha")
+        return
+
+    # Modo compartido: toma el candado de archivo y lee lo que hayan escrito los workers
+    store = ReservationStore(api.RESERVATIONS_FILE, api.RESERVATION_EVENTS_FILE, shared=True,
+                             archive=api.reservation_archive)
+    store.load()
+    before = cutoff_month(date.today(), args.months)
+    archived = store.archive_before(before)
+    print(f"🗄️  {archived} reservaciones anteriores a {before} archivadas en {api.RESERVATIONS_ARCHIVE_DIR}/")
+
+
+if __name__ == "__main__":
+    main()
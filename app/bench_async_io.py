@@ -0,0 +1,134 @@
+"""Latencia bajo carga mixta con la E/S en el event loop y en el pool de hilos.
+
+Corre la misma carga (lecturas de horarios y disponibilidad, logins, altas y
+cancelaciones de reservaciones) contra main.app dos veces, cada una en su
+propio proceso y directorio temporal: con STORAGE_WORKERS=0 (los handlers
+async llaman directo a los CSV, como antes) y con el pool de hilos.
+
+Las solicitudes llegan a ritmo fijo (`--rate` por segundo) y la latencia se
+mide desde el momento en que debían enviarse, así que un event loop bloqueado
+se refleja en la latencia de todas las solicitudes que tuvieron que esperar.
+Requiere httpx.
+
+Uso: python bench_async_io.py [--requests 4000] [--rate 500] [--workers 16]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(total: int, rate: float) -> dict:
+    import httpx
+    import main as api
+
+    api.initialize_users_csv()
+    api.initialize_courts_csv()
+    api.initialize_reservations_csv()
+    api.reservation_store.load()
+
+    rng = random.Random(42)
+    courts = [court['id'] for court in api.court_catalog.all()]
+    today = date.today()
+    created = []
+    latencies = []
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/register", json={"name": "Bench", "email": "bench@example.com", "password": "secreto"})
+
+        async def one_request(n: int, scheduled: float):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            roll = rng.random()
+            court_id = rng.choice(courts)
+            day = (today + timedelta(days=1 + rng.randrange(60))).isoformat()
+            if roll < 0.50:
+                await client.get(f"/reservations/{court_id}/{day}")
+            elif roll < 0.70:
+                await client.get("/availability", params={"sport_id": "tenis", "from": day, "to": day})
+            elif roll < 0.80:
+                await client.post("/login", json={"email": "bench@example.com", "password": "secreto"})
+            elif roll < 0.95 or not created:
+                response = await client.post("/reservations", json={
+                    "user_id": f"bench-{n % 500}",
+                    "court_id": court_id,
+                    "court_name": court_id,
+                    "date": day,
+                    "time": f"{6 + rng.randrange(16):02d}:00",
+                    "price": 300
+                })
+                if response.status_code == 201:
+                    created.append(response.json()["id"])
+            else:
+                await client.delete(f"/reservations/{created.pop()}")
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request(n, started + n / rate) for n in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "throughput": total / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99)
+    }
+
+
+def child(total: int, rate: float):
+    os.chdir(tempfile.mkdtemp(prefix="bench_async_io_"))
+    sys.path.insert(0, APP_DIR)
+    result = asyncio.run(run_load(total, rate))
+    print("RESULT " + json.dumps(result))
+
+
+def run_mode(workers: int, total: int, rate: float) -> dict:
+    env = dict(os.environ, STORAGE_WORKERS=str(workers))
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--requests", str(total), "--rate", str(rate)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia con E/S en el event loop vs. pool de hilos")
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--rate", type=float, default=500)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests, args.rate)
+        return
+
+    print(f"📊 {args.requests} solicitudes a {args.rate:.0f} req/s")
+    for label, workers in [("event loop (antes)", 0), (f"pool de {args.workers} hilos", args.workers)]:
+        r = run_mode(workers, args.requests, args.rate)
+        print(f"   {label:<22} {r['throughput']:8.0f} req/s | p50 {r['p50_ms']:7.2f} ms | "
+              f"p95 {r['p95_ms']:7.2f} ms | p99 {r['p99_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Logins por segundo según el número de procesos de hashing.
+
+Registra un usuario y lanza `--requests` logins concurrentes contra main.app
+con PASSWORD_HASH_WORKERS=1, 2, 4, ... hasta `--max-workers`, cada corrida en
+su propio proceso y directorio temporal. Con scrypt el login está limitado por
+CPU, así que el rendimiento debe crecer con los procesos hasta llegar al
+número de núcleos. Requiere httpx.
+
+Uso: python bench_login.py [--requests 200] [--concurrency 32] [--max-workers 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def run_logins(total: int, concurrency: int) -> dict:
+    import httpx
+    import main as api
+
+    api.initialize_users_csv()
+    api.password_hasher.start()
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/register", json={"name": "Bench", "email": "bench@example.com", "password": "secreto"})
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one_login():
+            async with semaphore:
+                response = await client.post("/login", json={"email": "bench@example.com", "password": "secreto"})
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    api.password_hasher.shutdown()
+    return {"requests": total, "throughput": total / elapsed}
+
+
+def child(total: int, concurrency: int):
+    os.chdir(tempfile.mkdtemp(prefix="bench_login_"))
+    sys.path.insert(0, APP_DIR)
+    result = asyncio.run(run_logins(total, concurrency))
+    print("RESULT " + json.dumps(result))
+
+
+def run_mode(workers: int, total: int, concurrency: int) -> dict:
+    env = dict(os.environ, PASSWORD_HASH_WORKERS=str(workers))
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--requests", str(total), "--concurrency", str(concurrency)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logins por segundo vs. procesos de hashing")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests, args.concurrency)
+        return
+
+    print(f"🔑 {args.requests} logins, {args.concurrency} concurrentes, {os.cpu_count()} núcleos")
+    workers = 1
+    baseline = None
+    while workers <= args.max_workers:
+        r = run_mode(workers, args.requests, args.concurrency)
+        baseline = baseline or r['throughput']
+        print(f"   {workers:>3} procesos {r['throughput']:8.1f} logins/s | x{r['throughput'] / baseline:5.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
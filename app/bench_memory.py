@@ -0,0 +1,136 @@
+"""Memoria residente de las reservaciones cargadas: dict por fila vs. tabla en columnas.
+
+Para cada tamaño (`--sizes`) genera un reservations.csv con ids uuid4,
+created_at con microsegundos (como los escribe main.py) y un usuario por
+cada `--rows-per-user` reservaciones. En un proceso nuevo por medición
+carga las filas como las deja csv.DictReader (un dict de textos por
+reservación, solo con el precio convertido a entero y sin índices) y el
+ReservationStore completo con sus índices, leyendo el CSV y leyendo la
+instantánea. Reporta el aumento de memoria residente (RSS) tras la carga y
+cuántas veces es menor la tabla.
+
+Tras leer el CSV, la RSS incluye memoria que glibc ya liberó pero no
+devolvió al sistema (los textos y dicts temporales del parseo); por eso
+la meta de 10x se revisa con la carga desde la instantánea, que es como
+arranca el servidor normalmente.
+
+Uso: python bench_memory.py [--sizes 100000,1000000] [--rows-per-user 20]
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+COURTS = [('t1', 'Cancha Tenis 1', 350), ('t2', 'Cancha Tenis 2', 350), ('t3', 'Cancha Tenis 3', 280),
+          ('t4', 'Cancha Tenis 4', 280), ('p1', 'Cancha Padel 1', 300), ('p2', 'Cancha Padel 2', 300),
+          ('r1', 'Cancha Raquetbol 1', 250), ('r2', 'Cancha Raquetbol 2', 250)]
+HOURS = [f"{hour:02d}:00" for hour in range(7, 23)]
+# Se espera al menos este ahorro
+TARGET_RATIO = 10
+
+
+def rss_bytes() -> int:
+    """Memoria residente actual (en Linux); fuera de Linux, el máximo alcanzado"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def write_reservations(path: str, rows: int, rows_per_user: int, rng: random.Random):
+    users = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(max(rows // rows_per_user, 1))]
+    first_day = date.today() - timedelta(days=rows // (len(COURTS) * len(HOURS)))
+    created = datetime.now() - timedelta(days=400)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'user_id', 'court_id', 'court_name', 'date',
+                         'time', 'price', 'created_at', 'status'])
+        for n in range(rows):
+            court_id, court_name, price = COURTS[n % len(COURTS)]
+            day = first_day + timedelta(days=n // (len(COURTS) * len(HOURS)))
+            created += timedelta(microseconds=rng.randrange(1, 30_000_000))
+            writer.writerow([
+                str(uuid.UUID(int=rng.getrandbits(128), version=4)), rng.choice(users),
+                court_id, court_name, day.isoformat(), HOURS[n // len(COURTS) % len(HOURS)], price,
+                created.isoformat(), 'cancelled' if rng.random() < 0.1 else 'confirmed'
+            ])
+
+
+def child(mode: str, data_dir: str):
+    os.chdir(data_dir)
+    sys.path.insert(0, APP_DIR)
+    sys.path.insert(0, os.path.dirname(APP_DIR))
+    from reservation_store import ReservationStore
+
+    gc.collect()
+    before = rss_bytes()
+    if mode == "dicts":
+        with open('reservations.csv', 'r', newline='', encoding='utf-8') as f:
+            loaded = list(csv.DictReader(f))
+        for row in loaded:
+            row['price'] = int(row['price'])
+        count = len(loaded)
+    else:
+        loaded = ReservationStore('reservations.csv', 'reservation_events.csv',
+                                  snapshot_path='reservations.snapshot' if mode != "csv" else None)
+        loaded.load()
+        if mode == "save":
+            loaded.save_snapshot()
+        count = sum(1 for _ in loaded.query())
+    gc.collect()
+    print("RESULT " + json.dumps({"bytes": rss_bytes() - before, "rows": count}))
+
+
+def run_child(mode: str, data_dir: str) -> dict:
+    output = subprocess.run([sys.executable, __file__, "--child", mode, "--dir", data_dir],
+                            capture_output=True, text=True, check=True).stdout
+    line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria de las reservaciones: dict por fila vs. tabla")
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--rows-per-user", type=int, default=20)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.dir)
+        return
+
+    failed = False
+    for rows in [int(size) for size in args.sizes.split(",")]:
+        data_dir = tempfile.mkdtemp(prefix="bench_memory_")
+        write_reservations(os.path.join(data_dir, "reservations.csv"), rows, args.rows_per_user, random.Random(42))
+        dicts = run_child("dicts", data_dir)
+        from_csv = run_child("csv", data_dir)
+        run_child("save", data_dir)
+        from_snapshot = run_child("snapshot", data_dir)
+        ratio = dicts["bytes"] / max(from_snapshot["bytes"], 1)
+        failed = failed or ratio < TARGET_RATIO
+
+        def size(result: dict) -> str:
+            return f"{result['bytes'] / 1e6:7.1f} MB ({result['bytes'] // rows} B/fila)"
+        print(f"🧠 {rows:>9} filas | dict por fila {size(dicts)} | tabla desde CSV {size(from_csv)} "
+              f"{dicts['bytes'] / max(from_csv['bytes'], 1):5.1f}x | desde instantánea {size(from_snapshot)} "
+              f"{ratio:5.1f}x {'✅' if ratio >= TARGET_RATIO else '⚠️'}")
+
+    if failed:
+        print(f"⚠️  La tabla no llegó a ocupar {TARGET_RATIO} veces menos que los dicts")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
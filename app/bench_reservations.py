@@ -0,0 +1,304 @@
+"""Benchmark reproducible de la API de reservaciones (main.py).
+
+Para cada tamaño (`--sizes`, por defecto 1k, 100k y 1M filas) genera
+users.csv y reservations.csv con ese número de filas en un directorio
+temporal, arranca main.app en un proceso aparte y corre una mezcla de
+registro, login, disponibilidad, agenda del día, reservación y cancelación con un cliente
+ASGI en proceso (httpx.ASGITransport), sin red de por medio.
+
+Reporta rendimiento y latencias p50/p95/p99 (total y por operación) y agrega
+la corrida a un archivo JSON (`--output`) para comparar cambios de
+almacenamiento o caché a lo largo del tiempo. Los datos se generan con una
+semilla fija, así que dos corridas con los mismos parámetros ven los mismos
+datos y la misma secuencia de operaciones. Requiere httpx.
+
+Uso: python bench_reservations.py [--sizes 1000,100000,1000000] [--requests 5000]
+     [--concurrency 32] [--mix register=5,login=15,availability=40,schedule=10,book=30,cancel=10]
+     [--output bench_results.json]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = "1000,100000,1000000"
+DEFAULT_MIX = "register=5,login=15,availability=40,schedule=10,book=30,cancel=10"
+OPERATIONS = ["register", "login", "availability", "schedule", "book", "cancel"]
+SEED_PASSWORD = "secreto"
+# Horas reservables en la carga: 06:00 a 21:00
+HOURS = [f"{hour:02d}:00" for hour in range(6, 22)]
+# Días hacia adelante en que caen disponibilidad y reservaciones nuevas
+FUTURE_DAYS = 60
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99)
+    }
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Operación desconocida en --mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+# Datos de prueba
+
+def seed_users(api, rows: int) -> list:
+    """Escribe `rows` usuarios con la misma contraseña; regresa sus correos"""
+    # Un solo hash para todos: calcular scrypt por fila tardaría horas con 1M
+    password_hash = api.password_hasher.hash_blocking(SEED_PASSWORD)
+    emails = []
+    with open(api.USERS_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'email', 'password', 'created_at'])
+        created_at = datetime(2025, 1, 1).isoformat()
+        for n in range(rows):
+            email = f"user{n}@bench.example.com"
+            writer.writerow([f"seed-user-{n}", f"Usuario {n}", email, password_hash, created_at])
+            emails.append(email)
+    return emails
+
+
+def seed_reservations(api, rows: int, rng: random.Random) -> list:
+    """Escribe `rows` reservaciones confirmadas sin choques de horario
+
+    Los días se llenan hacia atrás desde hoy + FUTURE_DAYS con cerca de la
+    mitad de los horarios ocupados, así que la ventana futura tiene huecos
+    libres y también choques. Regresa los ids de las reservaciones futuras.
+    """
+    courts = api.court_catalog.all()
+    today = date.today()
+    future = []
+    written = 0
+    day = today + timedelta(days=FUTURE_DAYS)
+    with open(api.RESERVATIONS_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'user_id', 'court_id', 'court_name', 'date',
+                         'time', 'price', 'created_at', 'status'])
+        while written < rows:
+            day_str = day.isoformat()
+            for court in courts:
+                for time_str in HOURS:
+                    if written >= rows:
+                        break
+                    if rng.random() < 0.5:
+                        continue
+                    reservation_id = f"seed-res-{written}"
+                    writer.writerow([
+                        reservation_id, f"seed-user-{rng.randrange(max(rows, 1))}",
+                        court['id'], court['name'], day_str, time_str,
+                        court['price_per_hour'], f"{day_str}T00:00:00", 'confirmed'
+                    ])
+                    if day > today:
+                        future.append(reservation_id)
+                    written += 1
+            day -= timedelta(days=1)
+    with open(api.RESERVATION_EVENTS_FILE, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow(['reservation_id', 'status', 'changed_at'])
+    return future
+
+
+# Carga
+
+async def run_load(rows: int, total: int, concurrency: int, mix: dict, seed: int) -> dict:
+    import httpx
+    import main as api
+
+    rng = random.Random(seed)
+    api.initialize_courts_csv()
+
+    started = time.perf_counter()
+    emails = seed_users(api, rows)
+    cancellable = seed_reservations(api, rows, rng)
+    seed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if api.database:
+        api.database.initialize()
+        api.database.import_users_csv(api.USERS_FILE)
+        api.database.import_reservations_csv(api.RESERVATIONS_FILE, api.RESERVATION_EVENTS_FILE)
+    await api.startup_event()
+    startup_seconds = time.perf_counter() - started
+
+    courts = api.court_catalog.all()
+    sports = sorted({court['sport_id'] for court in courts})
+    today = date.today()
+    names, weights = zip(*mix.items())
+    plan = rng.choices(names, weights=weights, k=total)
+    latencies = {name: [] for name in OPERATIONS}
+    statuses = {}
+
+    async def request(client, op: str, n: int):
+        if op == "register":
+            return await client.post("/register", json={
+                "name": f"Nuevo {n}", "email": f"new{n}@bench.example.com", "password": SEED_PASSWORD
+            })
+        if op == "login":
+            return await client.post("/login", json={"email": rng.choice(emails), "password": SEED_PASSWORD})
+        if op == "availability":
+            start = today + timedelta(days=1 + rng.randrange(FUTURE_DAYS - 7))
+            return await client.get("/availability", params={
+                "sport_id": rng.choice(sports),
+                "from": start.isoformat(),
+                "to": (start + timedelta(days=6)).isoformat()
+            })
+        if op == "schedule":
+            day = today + timedelta(days=1 + rng.randrange(FUTURE_DAYS))
+            return await client.get(f"/reservations/by-date/{day.isoformat()}", params={"by_sport": "true"})
+        if op == "book":
+            court = rng.choice(courts)
+            response = await client.post("/reservations", json={
+                "user_id": f"seed-user-{rng.randrange(max(rows, 1))}",
+                "court_id": court['id'],
+                "court_name": court['name'],
+                "date": (today + timedelta(days=1 + rng.randrange(FUTURE_DAYS))).isoformat(),
+                "time": rng.choice(HOURS),
+                "price": int(court['price_per_hour'])
+            })
+            if response.status_code == 201:
+                cancellable.append(response.json()["id"])
+            return response
+        if cancellable:
+            return await client.delete(f"/reservations/{cancellable.pop(rng.randrange(len(cancellable)))}")
+        return await client.get("/")
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        queue = list(enumerate(plan))
+        queue.reverse()
+
+        async def worker():
+            while queue:
+                n, op = queue.pop()
+                sent = time.perf_counter()
+                response = await request(client, op, n)
+                latencies[op].append((time.perf_counter() - sent) * 1000)
+                key = f"{op}:{response.status_code}"
+                statuses[key] = statuses.get(key, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    await api.shutdown_event()
+
+    all_latencies = [ms for samples in latencies.values() for ms in samples]
+    return {
+        "rows": rows,
+        "seed_seconds": seed_seconds,
+        "startup_seconds": startup_seconds,
+        "total": summarize(all_latencies, elapsed),
+        "operations": {op: summarize(samples, elapsed) for op, samples in latencies.items() if samples},
+        "status_codes": dict(sorted(statuses.items()))
+    }
+
+
+def child(rows: int, total: int, concurrency: int, mix: str, seed: int):
+    os.chdir(tempfile.mkdtemp(prefix="bench_reservations_"))
+    sys.path.insert(0, APP_DIR)
+    result = asyncio.run(run_load(rows, total, concurrency, parse_mix(mix), seed))
+    print("RESULT " + json.dumps(result))
+
+
+def run_size(rows: int, args) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--rows", str(rows), "--requests", str(args.requests),
+         "--concurrency", str(args.concurrency), "--mix", args.mix, "--seed", str(args.seed)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save_run(path: str, run: dict):
+    """Agrega la corrida al historial en `path` (una lista JSON)"""
+    history = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    history.append(run)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la API de reservaciones")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="filas de users.csv y reservations.csv")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.rows, args.requests, args.concurrency, args.mix, args.seed)
+        return
+
+    parse_mix(args.mix)
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "storage_backend": os.getenv("STORAGE_BACKEND", "csv"),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "seed": args.seed,
+        "results": []
+    }
+
+    print(f"📊 {args.requests} solicitudes, {args.concurrency} concurrentes | mezcla {args.mix}")
+    for rows in [int(size) for size in args.sizes.split(",")]:
+        r = run_size(rows, args)
+        run["results"].append(r)
+        t = r["total"]
+        print(f"   {rows:>9} filas | arranque {r['startup_seconds']:6.2f} s | {t['throughput']:8.0f} req/s | "
+              f"p50 {t['p50_ms']:7.2f} ms | p95 {t['p95_ms']:7.2f} ms | p99 {t['p99_ms']:7.2f} ms")
+        for op, s in r["operations"].items():
+            print(f"      {op:<13} p50 {s['p50_ms']:7.2f} ms | p95 {s['p95_ms']:7.2f} ms | p99 {s['p99_ms']:7.2f} ms")
+
+    save_run(args.output, run)
+    print(f"💾 Resultados agregados a {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Tiempo de arranque del almacén de reservaciones: CSV completo vs. instantánea.
+
+Para cada tamaño (`--sizes`) genera reservations.csv con ese número de filas
+en un directorio temporal y, cada medición en un proceso nuevo, carga el
+almacén leyendo todo el CSV, guarda la instantánea columnar y vuelve a
+cargarlo desde ella. Verifica que ambas cargas den el mismo contenido
+(filas, horarios ocupados y totales diarios).
+
+Uso: python bench_startup.py [--sizes 100000,1000000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def digest(store) -> list:
+    """Resumen comparable del contenido cargado"""
+    rows = store.all()
+    confirmed = sum(1 for row in rows if row['status'] == 'confirmed')
+    totals = store.daily_totals('2000-01-01', '2000-01-01')
+    sample = sorted(rows, key=lambda row: row['id'])[:: max(1, len(rows) // 1000)]
+    return [len(rows), confirmed, totals, [(r['id'], r['date'], r['time'], r['status']) for r in sample]]
+
+
+def child(mode: str, data_dir: str, rows: int):
+    os.chdir(data_dir)
+    sys.path.insert(0, APP_DIR)
+    import main as api
+    from reservation_store import ReservationStore
+
+    if mode == "seed":
+        from bench_reservations import seed_reservations
+        api.initialize_courts_csv()
+        seed_reservations(api, rows, random.Random(42))
+        return
+
+    snapshot_path = api.RESERVATIONS_SNAPSHOT_FILE if mode != "csv" else None
+    store = ReservationStore(api.RESERVATIONS_FILE, api.RESERVATION_EVENTS_FILE, snapshot_path=snapshot_path)
+    started = time.perf_counter()
+    store.load()
+    result = {"load_seconds": time.perf_counter() - started}
+    if mode == "save":
+        started = time.perf_counter()
+        store.save_snapshot()
+        result["save_seconds"] = time.perf_counter() - started
+        result["snapshot_bytes"] = os.path.getsize(snapshot_path)
+    result["digest"] = digest(store)
+    print("RESULT " + json.dumps(result))
+
+
+def run_child(mode: str, data_dir: str, rows: int = 0) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", mode, "--dir", data_dir, "--rows", str(rows)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    line = next((l for l in output.splitlines() if l.startswith("RESULT ")), None)
+    return json.loads(line[len("RESULT "):]) if line else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque desde CSV vs. instantánea columnar")
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.dir, args.rows)
+        return
+
+    failed = False
+    for rows in [int(size) for size in args.sizes.split(",")]:
+        data_dir = tempfile.mkdtemp(prefix="bench_startup_")
+        run_child("seed", data_dir, rows)
+        csv_bytes = os.path.getsize(os.path.join(data_dir, "reservations.csv"))
+        from_csv = run_child("csv", data_dir)
+        saved = run_child("save", data_dir)
+        from_snapshot = run_child("snapshot", data_dir)
+        same = from_csv["digest"] == from_snapshot["digest"]
+        failed = failed or not same
+        print(f"🚀 {rows:>9} filas | CSV {csv_bytes / 1e6:7.1f} MB en {from_csv['load_seconds']:6.2f} s | "
+              f"instantánea {saved['snapshot_bytes'] / 1e6:7.1f} MB en {from_snapshot['load_seconds']:6.2f} s "
+              f"(guardar {saved['save_seconds']:5.2f} s) | {'✅' if same else '❌'}")
+
+    if failed:
+        print("❌ La carga desde la instantánea no coincide con la del CSV")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Varios workers sobre el mismo directorio de datos (modo WEB_WORKERS > 1).
+
+Genera users.csv y reservations.csv con `--rows` filas y, para 1, 2, 4, ...
+hasta `--max-workers` procesos, arranca main.app en cada proceso sobre una
+copia de esos archivos. Todos esperan una señal común y durante `--seconds`
+hacen lecturas (reservaciones por cancha y fecha, disponibilidad) con un
+cliente ASGI en proceso; se reporta el total de lecturas por segundo, que
+debe crecer de forma casi lineal con los procesos hasta llegar al número de
+núcleos, porque las lecturas solo cuestan un `stat` para ver si otro worker
+escribió.
+
+Después cada worker intenta reservar los mismos `--slots` horarios en orden
+distinto. Se verifica que cada horario se haya reservado una sola vez en
+total, que cada worker vea todas las reservaciones hechas por los demás y
+que el CSV final no tenga horarios duplicados. Requiere httpx.
+
+Uso: python bench_workers.py [--rows 100000] [--seconds 5] [--max-workers 4] [--slots 32]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Canchas abiertas todos los días de 6:00 a 22:00
+OPEN_COURTS = ["t1", "t2", "t4", "r1"]
+BOOKING_USER = "bench-workers"
+
+
+def wait_for(path: str):
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+
+def booking_slots(count: int) -> list:
+    """Horarios que todos los workers intentan reservar, después de los datos sembrados"""
+    day = date.today() + timedelta(days=90)
+    slots = []
+    while len(slots) < count:
+        for court_id in OPEN_COURTS:
+            for hour in range(6, 22):
+                slots.append((court_id, day.isoformat(), f"{hour:02d}:00"))
+        day += timedelta(days=1)
+    return slots[:count]
+
+
+# Procesos hijos
+
+def seed(rows: int):
+    import main as api
+    from bench_reservations import seed_reservations, seed_users
+
+    api.initialize_courts_csv()
+    seed_users(api, rows)
+    seed_reservations(api, rows, random.Random(42))
+
+
+async def run_worker(index: int, seconds: float, slot_count: int) -> dict:
+    import httpx
+    import main as api
+
+    await api.startup_event()
+    courts = [court['id'] for court in api.court_catalog.all()]
+    rng = random.Random(index)
+    today = date.today()
+
+    with open(f"ready-{index}", "w"):
+        pass
+    wait_for("go")
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        reads = 0
+        deadline = time.perf_counter() + seconds
+
+        async def reader():
+            nonlocal reads
+            while time.perf_counter() < deadline:
+                day = (today + timedelta(days=1 + rng.randrange(60))).isoformat()
+                if rng.random() < 0.7:
+                    response = await client.get(f"/reservations/{rng.choice(courts)}/{day}")
+                else:
+                    response = await client.get("/availability", params={"sport_id": "tenis", "from": day, "to": day})
+                assert response.status_code == 200, response.text
+                reads += 1
+
+        await asyncio.gather(*(reader() for _ in range(8)))
+
+        slots = booking_slots(slot_count)
+        rng.shuffle(slots)
+        booked = 0
+        for court_id, day, hour in slots:
+            response = await client.post("/reservations", json={
+                "user_id": BOOKING_USER, "court_id": court_id, "date": day, "time": hour
+            })
+            assert response.status_code in (201, 409), response.text
+            booked += response.status_code == 201
+
+    with open(f"done-{index}", "w"):
+        pass
+    wait_for("verify")
+    seen = sum(1 for row in api.reservation_store.all()
+               if row['user_id'] == BOOKING_USER and row['status'] == 'confirmed')
+    await api.shutdown_event()
+    return {"reads": reads, "booked": booked, "seen": seen}
+
+
+def child(args):
+    os.chdir(args.dir)
+    sys.path.insert(0, APP_DIR)
+    if args.seed:
+        seed(args.rows)
+        return
+    result = asyncio.run(run_worker(args.index, args.seconds, args.slots))
+    print("RESULT " + json.dumps(result))
+
+
+# Proceso principal
+
+def run_workers(count: int, template: str, args) -> dict:
+    data_dir = tempfile.mkdtemp(prefix=f"bench_workers_{count}_")
+    shutil.rmtree(data_dir)
+    shutil.copytree(template, data_dir)
+
+    env = dict(os.environ, WEB_WORKERS=str(max(args.max_workers, 2)), PASSWORD_HASH_WORKERS="0")
+    processes = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--child", "--dir", data_dir, "--index", str(i),
+             "--seconds", str(args.seconds), "--slots", str(args.slots)],
+            env=env, stdout=subprocess.PIPE, text=True
+        )
+        for i in range(count)
+    ]
+
+    for i in range(count):
+        wait_for(os.path.join(data_dir, f"ready-{i}"))
+    open(os.path.join(data_dir, "go"), "w").close()
+    for i in range(count):
+        wait_for(os.path.join(data_dir, f"done-{i}"))
+    open(os.path.join(data_dir, "verify"), "w").close()
+
+    results = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"Un worker terminó con código {process.returncode}")
+        line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+        results.append(json.loads(line[len("RESULT "):]))
+
+    with open(os.path.join(data_dir, "reservations.csv"), "r", encoding="utf-8") as f:
+        slots = Counter(
+            (row['court_id'], row['date'], row['time'])
+            for row in csv.DictReader(f)
+            if row['user_id'] == BOOKING_USER and row['status'] == 'confirmed'
+        )
+    shutil.rmtree(data_dir)
+
+    return {
+        "workers": count,
+        "reads_per_second": sum(r["reads"] for r in results) / args.seconds,
+        "booked": sum(r["booked"] for r in results),
+        "seen": [r["seen"] for r in results],
+        "on_disk": len(slots),
+        "duplicates": sum(n - 1 for n in slots.values())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lecturas por segundo y consistencia con varios workers")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--slots", type=int, default=32)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--index", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    template = tempfile.mkdtemp(prefix="bench_workers_data_")
+    subprocess.run([sys.executable, __file__, "--child", "--seed", "--dir", template, "--rows", str(args.rows)],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    print(f"👷 {args.rows} filas, {args.seconds:g} s de lecturas por corrida, {os.cpu_count()} núcleos")
+    failed = False
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        r = run_workers(workers, template, args)
+        baseline = baseline or r["reads_per_second"]
+        consistent = r["booked"] == args.slots and r["on_disk"] == args.slots and not r["duplicates"] \
+            and all(seen == args.slots for seen in r["seen"])
+        failed = failed or not consistent
+        print(f"   {workers:>3} workers {r['reads_per_second']:9.0f} lecturas/s | x{r['reads_per_second'] / baseline:5.2f} | "
+              f"reservados {r['booked']}/{args.slots} | vistos por worker {r['seen']} | "
+              f"{'✅' if consistent else '❌'}")
+        workers *= 2
+    shutil.rmtree(template)
+
+    if failed:
+        print("❌ Reservaciones duplicadas, perdidas o no vistas por algún worker")
+        sys.exit(1)
+    print("✅ Todos los workers vieron las mismas reservaciones, sin duplicados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from shared.metrics import time_storage
+
+
+# Días en el orden de date.weekday() (lunes = 0), sin acentos
+DAY_NAMES = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom']
+
+# Bits de las 24 horas del día (bit h = hora h:00, igual que en los mapas de ocupación)
+FULL_DAY_MASK = (1 << 24) - 1
+
+_TIME_RE = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*([AaPp])\.?\s*[Mm]\.?')
+
+
+class CourtSchedule(NamedTuple):
+    """Horario ya interpretado: horas [open_hour, close_hour), máscara de días
+    (bit 0 = lunes) y máscara de horas reservables (bit h = hora h:00)"""
+    open_hour: int
+    close_hour: int
+    days_mask: int
+    hours_mask: int
+
+    def is_open_on(self, day: date) -> bool:
+        return bool(self.days_mask >> day.weekday() & 1)
+
+    def hours_on(self, day: date) -> int:
+        """Horas reservables ese día (0 si la cancha no abre)"""
+        return self.close_hour - self.open_hour if self.is_open_on(day) else 0
+
+    def allows(self, day: date, hour: int) -> bool:
+        """True si la hora h:00 de ese día está dentro del horario"""
+        return self.is_open_on(day) and bool(self.hours_mask >> hour & 1)
+
+    def closed_mask(self, day: date) -> int:
+        """Horas no reservables ese día, como mapa de bits"""
+        return FULL_DAY_MASK & ~self.hours_mask if self.is_open_on(day) else FULL_DAY_MASK
+
+
+def _hour_24(match) -> int:
+    hour = int(match.group(1)) % 12
+    return hour + 12 if match.group(3).lower() == 'p' else hour
+
+
+def parse_hours(schedule: str) -> Optional[Tuple[int, int]]:
+    """'6:00 AM - 10:00 PM' -> (6, 22); None si no se reconoce"""
+    matches = list(_TIME_RE.finditer(schedule))
+    if len(matches) != 2:
+        return None
+    open_hour, close_hour = _hour_24(matches[0]), _hour_24(matches[1])
+    if close_hour == 0:
+        close_hour = 24
+    return (open_hour, close_hour) if open_hour < close_hour else None
+
+
+def _day_index(name: str) -> int:
+    plain = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().strip().lower()
+    return DAY_NAMES.index(plain[:3])
+
+
+def parse_days(available_days: str) -> Optional[int]:
+    """'Lun-Vie' -> máscara con los bits 0..4; acepta rangos y listas ('Lun, Mié, Vie')"""
+    mask = 0
+    try:
+        for part in filter(None, (p.strip() for p in available_days.split(','))):
+            first, _, last = part.partition('-')
+            start = _day_index(first)
+            end = _day_index(last) if last else start
+            day = start
+            while True:
+                mask |= 1 << day
+                if day == end:
+                    break
+                day = (day + 1) % 7
+    except ValueError:
+        return None
+    return mask or None
+
+
+def parse_schedule(schedule: str, available_days: str) -> Optional[CourtSchedule]:
+    hours = parse_hours(schedule)
+    days = parse_days(available_days)
+    if hours is None or days is None:
+        return None
+    open_hour, close_hour = hours
+    hours_mask = ((1 << close_hour) - 1) & ~((1 << open_hour) - 1)
+    return CourtSchedule(open_hour, close_hour, days, hours_mask)
+
+
+def parse_slot_hour(time: str) -> Optional[int]:
+    """'18:00' -> 18; None si no es una hora en punto válida"""
+    hour, sep, minutes = time.partition(':')
+    if not sep or minutes != '00' or not hour.isdigit() or int(hour) > 23:
+        return None
+    return int(hour)
+
+
+class CourtCatalog:
+    """Catálogo de canchas en memoria, indexado por deporte y ya serializado.
+
+    courts.csv solo se vuelve a leer cuando cambia su fecha de modificación
+    o su tamaño, así que las consultas normales no tocan el disco más que
+    para un `stat`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._courts: List[dict] = []
+        self._by_id: Dict[str, dict] = {}
+        self._by_sport: Dict[str, List[dict]] = {}
+        # Horario interpretado por cancha (None si no se pudo leer)
+        self._schedules: Dict[str, Optional[CourtSchedule]] = {}
+        # Cuerpo JSON y ETag por clave ('*' = catálogo completo, o el sport_id)
+        self._payloads: Dict[str, Tuple[bytes, str]] = {}
+
+    def _current_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Recarga el catálogo si courts.csv cambió desde la última lectura"""
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            if signature == self._signature:
+                return
+
+            courts = []
+            if signature is not None:
+                with time_storage('scan', self.path), open(self.path, 'r', encoding='utf-8') as file:
+                    reader = csv.DictReader(file)
+                    for row in reader:
+                        courts.append({
+                            'id': row['id'],
+                            'sport_id': row['sport_id'],
+                            'name': row['name'],
+                            'status': row['status'],
+                            'schedule': row['schedule'],
+                            'available_days': row['available_days'],
+                            'features': row['features'],
+                            'price_per_hour': int(row['price_per_hour'])
+                        })
+
+            by_sport: Dict[str, List[dict]] = {}
+            for court in courts:
+                by_sport.setdefault(court['sport_id'], []).append(court)
+
+            payloads = {'*': self._serialize(courts)}
+            for sport_id, sport_courts in by_sport.items():
+                payloads[sport_id] = self._serialize(sport_courts)
+
+            self._courts = courts
+            self._by_id = {court['id']: court for court in courts}
+            self._by_sport = by_sport
+            self._schedules = {
+                court['id']: parse_schedule(court['schedule'], court['available_days'])
+                for court in courts
+            }
+            self._payloads = payloads
+            self._signature = signature
+
+    @staticmethod
+    def _serialize(courts: List[dict]) -> Tuple[bytes, str]:
+        body = json.dumps(courts, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        return body, etag
+
+    def all(self) -> List[dict]:
+        """Todas las canchas"""
+        self._refresh()
+        return [dict(court) for court in self._courts]
+
+    def by_sport(self, sport_id: str) -> List[dict]:
+        """Canchas de un deporte"""
+        self._refresh()
+        return [dict(court) for court in self._by_sport.get(sport_id, [])]
+
+    def get(self, court_id: str) -> Optional[dict]:
+        """Una cancha por id"""
+        self._refresh()
+        court = self._by_id.get(court_id)
+        return dict(court) if court else None
+
+    def schedule(self, court_id: str) -> Optional[CourtSchedule]:
+        """Horario interpretado de una cancha"""
+        self._refresh()
+        return self._schedules.get(court_id)
+
+    def response(self, request: Request, sport_id: Optional[str] = None) -> Response:
+        """Respuesta JSON con ETag; 304 si el cliente ya tiene esa versión"""
+        self._refresh()
+        body, etag = self._payloads.get(sport_id or '*') or self._serialize([])
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        if_none_match = request.headers.get('if-none-match', '')
+        if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=body, media_type='application/json', headers=headers)
@@ -1,13 +1,28 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Iterator, Optional, List, Tuple
+import asyncio
 import csv
+import functools
 import os
-from datetime import datetime, date
-import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
 import uuid
 
+# Módulos compartidos entre las apps (carpeta shared/ en la raíz del repo)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.password_hasher import PasswordHasher
+from shared.listing import NEXT_CURSOR_HEADER, listing_response
+from shared.metrics import MetricsMiddleware, metrics
+from shared.user_directory import DuplicateEmailError, UserDirectory
+
+from court_catalog import CourtCatalog, CourtSchedule, parse_slot_hour
+from reservation_archive import ReservationArchive
+from reservation_store import BatchConflictError, ReservationStore, SlotConflictError
+from sqlite_store import SQLiteStorage
+
 app = FastAPI(title="Sistema de Autenticación y Reservas Deportivas")
 
 # Configurar CORS
@@ -17,12 +32,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Latencia y conteo por ruta, expuestos en /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Archivos CSV
 USERS_FILE = "users.csv"
 COURTS_FILE = "courts.csv"
 RESERVATIONS_FILE = "reservations.csv"
+RESERVATION_EVENTS_FILE = "reservation_events.csv"
+# Instantánea columnar de las reservaciones para arrancar sin leer todo el CSV
+RESERVATIONS_SNAPSHOT_FILE = "reservations.snapshot"
+# Cada cuántos segundos se reescribe la instantánea (0 = solo al apagar)
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "0"))
+# Segmentos gzip por mes de las reservaciones archivadas (ver archive_reservations.py)
+RESERVATIONS_ARCHIVE_DIR = "reservations_archive"
+
+# Máximo de días que puede abarcar una consulta de disponibilidad
+MAX_AVAILABILITY_DAYS = 62
+# Rango máximo de días para /stats/courts
+MAX_STATS_DAYS = 366
+# Horarios máximos en una reservación en lote
+MAX_BATCH_SLOTS = 200
+
+# Hilos para la E/S de archivos; con STORAGE_WORKERS=0 se ejecuta en el event loop
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "16"))
+storage_executor = (
+    ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+    if STORAGE_WORKERS > 0 else None
+)
+
+# Procesos de uvicorn que atienden la API; con más de uno los almacenes CSV
+# coordinan sus escrituras con candados de archivo y releen lo que agregan los demás
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+
+# Usuarios indexados por correo en memoria
+user_directory = UserDirectory(USERS_FILE, ['id', 'name', 'email', 'password', 'created_at'],
+                               shared=WEB_WORKERS > 1)
+
+# Procesos para scrypt (PASSWORD_HASH_WORKERS, por defecto uno por núcleo)
+password_hasher = PasswordHasher()
+
+# Catálogo de canchas en memoria; se recarga solo si cambia courts.csv
+court_catalog = CourtCatalog(COURTS_FILE)
+
+# Backend de almacenamiento: "csv" (por defecto) o "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv")
+DATABASE_FILE = os.getenv("DATABASE_FILE", "reservas.db")
+
+if STORAGE_BACKEND == "sqlite":
+    database = SQLiteStorage(DATABASE_FILE)
+    reservation_store = database.reservations
+else:
+    database = None
+    # Meses pasados archivados; no se cargan en memoria
+    reservation_archive = ReservationArchive(RESERVATIONS_ARCHIVE_DIR)
+    # Reservaciones indexadas en memoria (se cargan al iniciar)
+    reservation_store = ReservationStore(RESERVATIONS_FILE, RESERVATION_EVENTS_FILE, shared=WEB_WORKERS > 1,
+                                         archive=reservation_archive, snapshot_path=RESERVATIONS_SNAPSHOT_FILE)
 
 # Modelos Pydantic
 class UserRegister(BaseModel):
@@ -51,12 +120,36 @@ class Court(BaseModel):
     price_per_hour: int
 
 class ReservationCreate(BaseModel):
+    """`court_name` y `price` se aceptan por compatibilidad pero se ignoran:
+    se toman del catálogo de canchas"""
     user_id: str
     court_id: str
-    court_name: str
     date: str
     time: str
-    price: int
+    court_name: Optional[str] = None
+    price: Optional[int] = None
+
+class SlotRequest(BaseModel):
+    date: str
+    time: str
+
+class RecurrenceRule(BaseModel):
+    """Repetición semanal: `weekdays` (0 = lunes; por defecto el día de start_date)
+    cada `interval_weeks` semanas, hasta `until` (inclusive) o `count` horarios"""
+    start_date: str
+    time: str
+    weekdays: Optional[List[int]] = None
+    interval_weeks: int = 1
+    until: Optional[str] = None
+    count: Optional[int] = None
+
+class ReservationBatchCreate(BaseModel):
+    user_id: str
+    court_id: str
+    court_name: Optional[str] = None
+    price: Optional[int] = None
+    slots: Optional[List[SlotRequest]] = None
+    recurrence: Optional[RecurrenceRule] = None
 
 class ReservationResponse(BaseModel):
     id: str
@@ -70,10 +163,6 @@ class ReservationResponse(BaseModel):
     status: str
 
 # Funciones auxiliares
-def hash_password(password: str) -> str:
-    """Hashea la contraseña usando SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def initialize_users_csv():
     """Inicializa el archivo CSV de usuarios"""
     if not os.path.exists(USERS_FILE):
@@ -145,120 +234,239 @@ def initialize_courts_csv():
 
 def get_user_by_email(email: str) -> Optional[dict]:
     """Busca un usuario por email en el CSV"""
-    if not os.path.exists(USERS_FILE):
-        return None
+    if database:
+        return database.get_user_by_email(email)
     
-    with open(USERS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['email'].lower() == email.lower():
-                return row
-    return None
+    return user_directory.get(email)
 
 def save_user(user_data: dict):
-    """Guarda un nuevo usuario en el CSV"""
-    with open(USERS_FILE, 'a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            user_data['id'],
-            user_data['name'],
-            user_data['email'],
-            user_data['password'],
-            user_data['created_at']
-        ])
+    """Guarda un nuevo usuario; lanza DuplicateEmailError si el correo ya está registrado"""
+    if database:
+        database.save_user(user_data)
+        return
+    
+    user_directory.add(user_data)
+
+def update_password(user: dict, password_hash: str):
+    """Reemplaza el hash de la contraseña de un usuario (p. ej. de SHA-256 a scrypt)"""
+    if database:
+        database.update_user_password(user['id'], password_hash)
+        return
+    
+    user_directory.update(user['email'], {'password': password_hash})
 
 def get_courts_by_sport(sport_id: str) -> List[dict]:
     """Obtiene todas las canchas de un deporte específico"""
-    if not os.path.exists(COURTS_FILE):
-        return []
-    
-    courts = []
-    with open(COURTS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['sport_id'] == sport_id:
-                courts.append({
-                    'id': row['id'],
-                    'sport_id': row['sport_id'],
-                    'name': row['name'],
-                    'status': row['status'],
-                    'schedule': row['schedule'],
-                    'available_days': row['available_days'],
-                    'features': row['features'],
-                    'price_per_hour': int(row['price_per_hour'])
-                })
-    return courts
+    return court_catalog.by_sport(sport_id)
+
+def query_users(after: Optional[str] = None) -> Iterator[dict]:
+    """Recorre los usuarios sin contraseñas a partir del id `after`"""
+    if database:
+        return database.query_users(after)
+    
+    return (
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'email': row['email'],
+            'created_at': row['created_at']
+        }
+        for row in user_directory.query(after)
+    )
 
 def save_reservation(reservation_data: dict):
-    """Guarda una nueva reservación en el CSV"""
-    with open(RESERVATIONS_FILE, 'a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            reservation_data['id'],
-            reservation_data['user_id'],
-            reservation_data['court_id'],
-            reservation_data['court_name'],
-            reservation_data['date'],
-            reservation_data['time'],
-            reservation_data['price'],
-            reservation_data['created_at'],
-            reservation_data['status']
-        ])
+    """Guarda una nueva reservación en el CSV y en los índices en memoria
+
+    El almacén revisa el horario y lo aparta bajo su candado; lanza
+    SlotConflictError si ya está ocupado.
+    """
+    reservation_store.add(reservation_data)
 
 def get_reservations_by_court_and_date(court_id: str, date_str: str) -> List[dict]:
     """Obtiene todas las reservaciones de una cancha en una fecha específica"""
-    if not os.path.exists(RESERVATIONS_FILE):
-        return []
-    
-    reservations = []
-    with open(RESERVATIONS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['court_id'] == court_id and row['date'] == date_str and row['status'] == 'confirmed':
-                reservations.append({
-                    'id': row['id'],
-                    'time': row['time'],
-                    'user_id': row['user_id']
-                })
-    return reservations
+    return [
+        {
+            'id': row['id'],
+            'time': row['time'],
+            'user_id': row['user_id']
+        }
+        for row in reservation_store.by_court_and_date(court_id, date_str)
+    ]
+
+def get_reservations_by_user(user_id: str, include_archived: bool = False) -> List[dict]:
+    """Obtiene las reservaciones de un usuario (con `include_archived`, también las archivadas)"""
+    return reservation_store.by_user(user_id, include_archived)
+
+def get_reservations_by_date(date_str: str, by_sport: bool = False) -> dict:
+    """Reservaciones confirmadas de una fecha en todas las canchas, por hora y cancha
+
+    Con `by_sport` se agrupan por el deporte de cada cancha según el catálogo.
+    """
+    reservations = reservation_store.by_date(date_str)
+    result = {'date': date_str, 'count': len(reservations)}
+    if not by_sport:
+        return {**result, 'reservations': reservations}
+    sport_of = {court['id']: court['sport_id'] for court in court_catalog.all()}
+    sports = {}
+    for row in reservations:
+        sports.setdefault(sport_of.get(row['court_id'], ''), []).append(row)
+    return {**result, 'by_sport': dict(sorted(sports.items()))}
+
+def book_reservations(reservations: List[dict]):
+    """Guarda un lote de reservaciones (todas o ninguna); lanza BatchConflictError"""
+    reservation_store.add_many(reservations)
+
+def expand_recurrence(rule: RecurrenceRule) -> List[SlotRequest]:
+    """Horarios de una regla semanal; ValueError con el motivo si la regla no es válida"""
+    try:
+        start = datetime.strptime(rule.start_date, '%Y-%m-%d').date()
+        until = datetime.strptime(rule.until, '%Y-%m-%d').date() if rule.until else None
+    except ValueError:
+        raise ValueError("Formato de fecha inválido. Use YYYY-MM-DD")
+    if until is None and rule.count is None:
+        raise ValueError("La repetición necesita 'until' o 'count'")
+    if rule.interval_weeks < 1:
+        raise ValueError("'interval_weeks' debe ser al menos 1")
+    weekdays = sorted(set(rule.weekdays if rule.weekdays is not None else [start.weekday()]))
+    if not weekdays or any(day < 0 or day > 6 for day in weekdays):
+        raise ValueError("'weekdays' debe contener días del 0 (lunes) al 6 (domingo)")
+    
+    slots = []
+    week_start = start - timedelta(days=start.weekday())
+    while len(slots) <= MAX_BATCH_SLOTS:
+        for weekday in weekdays:
+            day = week_start + timedelta(days=weekday)
+            if day < start:
+                continue
+            if (until and day > until) or (rule.count is not None and len(slots) >= rule.count):
+                return slots
+            slots.append(SlotRequest(date=day.isoformat(), time=rule.time))
+        week_start += timedelta(weeks=rule.interval_weeks)
+    return slots
+
+def get_bookable_court(court_id: str) -> Tuple[dict, Optional[CourtSchedule]]:
+    """Cancha y horario interpretado desde el catálogo en memoria; 404 si no existe"""
+    court = court_catalog.get(court_id)
+    if court is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cancha no encontrada"
+        )
+    return court, court_catalog.schedule(court_id)
 
-def get_reservations_by_user(user_id: str) -> List[dict]:
-    """Obtiene todas las reservaciones de un usuario"""
-    if not os.path.exists(RESERVATIONS_FILE):
-        return []
-    
-    reservations = []
-    with open(RESERVATIONS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['user_id'] == user_id:
-                reservations.append({
-                    'id': row['id'],
-                    'user_id': row['user_id'],
-                    'court_id': row['court_id'],
-                    'court_name': row['court_name'],
-                    'date': row['date'],
-                    'time': row['time'],
-                    'price': int(row['price']),
-                    'created_at': row['created_at'],
-                    'status': row['status']
-                })
-    return reservations
+def slot_error(schedule: Optional[CourtSchedule], slot_date: date, time: str) -> Optional[str]:
+    """Motivo por el que no se puede reservar ese horario, o None si es válido
+    
+    Si el horario de la cancha no se pudo interpretar solo se valida la hora.
+    """
+    hour = parse_slot_hour(time)
+    if hour is None:
+        return "Hora inválida. Use HH:00"
+    if schedule is None:
+        return None
+    if not schedule.is_open_on(slot_date):
+        return "La cancha no abre ese día"
+    if not schedule.allows(slot_date, hour):
+        return f"Fuera del horario de la cancha ({schedule.open_hour}:00 - {schedule.close_hour}:00)"
+    return None
 
-def check_reservation_conflict(court_id: str, date_str: str, time: str) -> bool:
-    """Verifica si existe un conflicto en la reservación"""
-    if not os.path.exists(RESERVATIONS_FILE):
-        return False
-    
-    with open(RESERVATIONS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if (row['court_id'] == court_id and 
-                row['date'] == date_str and 
-                row['time'] == time and 
-                row['status'] == 'confirmed'):
-                return True
-    return False
+def slot_time(time: str) -> str:
+    """Hora ya validada en forma canónica: '8:00' -> '08:00'"""
+    return f"{parse_slot_hour(time):02d}:00"
+
+def get_occupancy_grid(court_ids: List[str], dates: List[str]) -> dict:
+    """Mapas de horas no disponibles por cancha, alineados con `dates`
+    
+    Se combinan las horas reservadas con las que quedan fuera del horario
+    de la cancha (o todo el día si no abre).
+    """
+    grid = {}
+    for court_id in court_ids:
+        schedule = court_catalog.schedule(court_id)
+        grid[court_id] = [
+            reservation_store.occupancy(court_id, d)
+            | (schedule.closed_mask(date.fromisoformat(d)) if schedule else 0)
+            for d in dates
+        ]
+    return grid
+
+def _stats_entry(reservations: int, revenue: int, available_hours: int) -> dict:
+    return {
+        'reservations': reservations,
+        'revenue': revenue,
+        'available_hours': available_hours,
+        'utilization': round(reservations / available_hours, 4) if available_hours else 0.0
+    }
+
+def get_court_stats(dates: List[date]) -> dict:
+    """Ingreso y ocupación por cancha, deporte y día a partir de los totales diarios
+    
+    Cada reservación ocupa una hora; las horas disponibles salen del horario
+    y los días de apertura de cada cancha.
+    """
+    courts = court_catalog.all()
+    hours = {}
+    for court in courts:
+        schedule = court_catalog.schedule(court['id'])
+        hours[court['id']] = [schedule.hours_on(day) if schedule else 0 for day in dates]
+    
+    by_court = {court['id']: [0, 0] for court in courts}
+    by_day = {day.isoformat(): [0, 0] for day in dates}
+    for row in reservation_store.daily_totals(dates[0].isoformat(), dates[-1].isoformat()):
+        court_totals = by_court.setdefault(row['court_id'], [0, 0])
+        court_totals[0] += row['reservations']
+        court_totals[1] += row['revenue']
+        day_totals = by_day[row['date']]
+        day_totals[0] += row['reservations']
+        day_totals[1] += row['revenue']
+    
+    sport_of = {court['id']: court['sport_id'] for court in courts}
+    name_of = {court['id']: court['name'] for court in courts}
+    by_sport = {}
+    for court_id, (count, revenue) in by_court.items():
+        totals = by_sport.setdefault(sport_of.get(court_id, ''), [0, 0, 0])
+        totals[0] += count
+        totals[1] += revenue
+        totals[2] += sum(hours.get(court_id, []))
+    
+    day_hours = [sum(court_hours[i] for court_hours in hours.values()) for i in range(len(dates))]
+    total_count = sum(count for count, _ in by_court.values())
+    total_revenue = sum(revenue for _, revenue in by_court.values())
+    return {
+        'totals': _stats_entry(total_count, total_revenue, sum(day_hours)),
+        'by_sport': {
+            sport_id: _stats_entry(count, revenue, available)
+            for sport_id, (count, revenue, available) in sorted(by_sport.items())
+        },
+        'by_court': {
+            court_id: {
+                'name': name_of.get(court_id, court_id),
+                'sport_id': sport_of.get(court_id, ''),
+                **_stats_entry(count, revenue, sum(hours.get(court_id, [])))
+            }
+            for court_id, (count, revenue) in by_court.items()
+        },
+        'by_day': [
+            {'date': day, **_stats_entry(count, revenue, day_hours[i])}
+            for i, (day, (count, revenue)) in enumerate(by_day.items())
+        ]
+    }
+
+async def run_storage(func, *args):
+    """Ejecuta una operación de almacenamiento sin bloquear el event loop"""
+    if storage_executor is None:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(storage_executor, functools.partial(func, *args))
+
+# Tarea que reescribe la instantánea cada SNAPSHOT_INTERVAL segundos
+snapshot_task: Optional[asyncio.Task] = None
+
+async def save_snapshots():
+    """Reescribe la instantánea periódicamente, en un hilo de almacenamiento"""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        await run_storage(reservation_store.save_snapshot)
 
 # Eventos de inicio
 @app.on_event("startup")
@@ -267,10 +475,40 @@ async def startup_event():
     initialize_users_csv()
     initialize_courts_csv()
     initialize_reservations_csv()
+    if database:
+        database.initialize()
+        database.import_courts_csv(COURTS_FILE)
+    reservation_store.load()
+    await run_storage(password_hasher.start)
+    if SNAPSHOT_INTERVAL > 0 and not database:
+        global snapshot_task
+        snapshot_task = asyncio.create_task(save_snapshots())
     print("✅ Sistema iniciado correctamente")
     print(f"📁 Archivo de usuarios: {USERS_FILE}")
     print(f"🏟️  Archivo de canchas: {COURTS_FILE}")
     print(f"📅 Archivo de reservaciones: {RESERVATIONS_FILE}")
+    print(f"🧾 Log de cambios de estado: {RESERVATION_EVENTS_FILE}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Consolida el log de eventos y guarda la instantánea antes de apagar"""
+    if snapshot_task:
+        snapshot_task.cancel()
+    if database:
+        reservation_store.compact()
+    else:
+        # Sin eventos pendientes el CSV ya está al día: no hace falta reescribirlo
+        if reservation_store._pending_events > 0:
+            reservation_store.compact()
+        reservation_store.save_snapshot()
+    if storage_executor:
+        storage_executor.shutdown(wait=True)
+    password_hasher.shutdown()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return metrics.response()
 
 # Endpoints de autenticación
 @app.get("/")
@@ -290,10 +528,14 @@ async def root():
                 "by_sport": "/courts/{sport_id}",
                 "all": "/courts"
             },
+            "availability": "/availability?sport_id=&from=&to=",
+            "stats": "/stats/courts?from=&to=",
             "reservations": {
                 "create": "/reservations",
+                "batch": "/reservations/batch",
                 "by_court_date": "/reservations/{court_id}/{date}",
-                "by_user": "/reservations/user/{user_id}",
+                "by_date": "/reservations/by-date/{date}?by_sport=",
+                "by_user": "/reservations/user/{user_id}?include_archived=",
                 "all": "/reservations"
             }
         }
@@ -302,7 +544,7 @@ async def root():
 @app.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user: UserRegister):
     """Registra un nuevo usuario"""
-    existing_user = get_user_by_email(user.email)
+    existing_user = await run_storage(get_user_by_email, user.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -316,7 +558,7 @@ async def register(user: UserRegister):
         )
     
     user_id = str(uuid.uuid4())
-    hashed_password = hash_password(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     created_at = datetime.now().isoformat()
     
     user_data = {
@@ -327,7 +569,14 @@ async def register(user: UserRegister):
         'created_at': created_at
     }
     
-    save_user(user_data)
+    try:
+        await run_storage(save_user, user_data)
+    except DuplicateEmailError:
+        # Otro registro con el mismo correo se guardó entre la revisión y este
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El correo electrónico ya está registrado"
+        )
     
     return UserResponse(
         id=user_id,
@@ -339,7 +588,7 @@ async def register(user: UserRegister):
 @app.post("/login", response_model=UserResponse)
 async def login(credentials: UserLogin):
     """Inicia sesión de un usuario"""
-    user = get_user_by_email(credentials.email)
+    user = await run_storage(get_user_by_email, credentials.email)
     
     if not user:
         raise HTTPException(
@@ -347,13 +596,17 @@ async def login(credentials: UserLogin):
             detail="Credenciales incorrectas"
         )
     
-    hashed_password = hash_password(credentials.password)
-    if user['password'] != hashed_password:
+    valid, upgraded_hash = await password_hasher.check(credentials.password, user['password'])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales incorrectas"
         )
     
+    # Los hashes SHA-256 anteriores se reemplazan por scrypt al iniciar sesión
+    if upgraded_hash:
+        await run_storage(update_password, user, upgraded_hash)
+    
     return UserResponse(
         id=user['id'],
         name=user['name'],
@@ -362,27 +615,24 @@ async def login(credentials: UserLogin):
     )
 
 @app.get("/users")
-async def get_all_users():
-    """Obtiene todos los usuarios (sin contraseñas)"""
-    if not os.path.exists(USERS_FILE):
-        return []
-    
-    users = []
-    with open(USERS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            users.append({
-                'id': row['id'],
-                'name': row['name'],
-                'email': row['email'],
-                'created_at': row['created_at']
-            })
-    
-    return users
+async def get_all_users(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")
+):
+    """Obtiene los usuarios (sin contraseñas), paginados con `limit` y `after`"""
+    try:
+        rows = await run_storage(query_users, after)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+    return await run_storage(listing_response, rows, limit, fmt)
 
 # Endpoints de canchas
 @app.get("/courts/{sport_id}")
-async def get_courts(sport_id: str):
+async def get_courts(sport_id: str, request: Request):
     """Obtiene todas las canchas de un deporte específico"""
     valid_sports = ['raquetbol', 'tenis', 'padel', 'pickleball', 
                    'voleibol', 'baloncesto', 'badminton', 'squash']
@@ -393,31 +643,12 @@ async def get_courts(sport_id: str):
             detail=f"Deporte no encontrado. Deportes válidos: {', '.join(valid_sports)}"
         )
     
-    courts = get_courts_by_sport(sport_id)
-    return courts
+    return await run_storage(court_catalog.response, request, sport_id)
 
 @app.get("/courts")
-async def get_all_courts():
+async def get_all_courts(request: Request):
     """Obtiene todas las canchas disponibles"""
-    if not os.path.exists(COURTS_FILE):
-        return []
-    
-    courts = []
-    with open(COURTS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            courts.append({
-                'id': row['id'],
-                'sport_id': row['sport_id'],
-                'name': row['name'],
-                'status': row['status'],
-                'schedule': row['schedule'],
-                'available_days': row['available_days'],
-                'features': row['features'],
-                'price_per_hour': int(row['price_per_hour'])
-            })
-    
-    return courts
+    return await run_storage(court_catalog.response, request)
 
 # Endpoints de reservaciones
 @app.post("/reservations", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED)
@@ -437,123 +668,303 @@ async def create_reservation(reservation: ReservationCreate):
             detail="Formato de fecha inválido. Use YYYY-MM-DD"
         )
     
-    # Verificar conflictos
-    if check_reservation_conflict(reservation.court_id, reservation.date, reservation.time):
+    # Cancha, horario y precio salen del catálogo, no del cliente
+    court, schedule = await run_storage(get_bookable_court, reservation.court_id)
+    error = slot_error(schedule, reservation_date, reservation.time)
+    if error:
         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Este horario ya está reservado"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
         )
     
     reservation_id = str(uuid.uuid4())
     created_at = datetime.now().isoformat()
     
+    # Fecha y hora en forma canónica: '2030-1-5' y '8:00' son el mismo horario que '2030-01-05' y '08:00'
     reservation_data = {
         'id': reservation_id,
         'user_id': reservation.user_id,
         'court_id': reservation.court_id,
-        'court_name': reservation.court_name,
-        'date': reservation.date,
-        'time': reservation.time,
-        'price': reservation.price,
+        'court_name': court['name'],
+        'date': reservation_date.isoformat(),
+        'time': slot_time(reservation.time),
+        'price': court['price_per_hour'],
         'created_at': created_at,
         'status': 'confirmed'
     }
     
-    save_reservation(reservation_data)
-    
-    return ReservationResponse(
-        id=reservation_id,
-        user_id=reservation.user_id,
-        court_id=reservation.court_id,
-        court_name=reservation.court_name,
-        date=reservation.date,
-        time=reservation.time,
-        price=reservation.price,
-        created_at=created_at,
-        status='confirmed'
-    )
+    # El almacén revisa y aparta el horario bajo su candado
+    try:
+        await run_storage(save_reservation, reservation_data)
+    except SlotConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Este horario ya está reservado"
+        )
+    
+    return ReservationResponse(**reservation_data)
+
+@app.post("/reservations/batch", status_code=status.HTTP_201_CREATED)
+async def create_reservation_batch(batch: ReservationBatchCreate):
+    """Crea varias reservaciones de una cancha en una sola operación
+    
+    Acepta una lista de horarios (`slots`) o una regla semanal (`recurrence`).
+    Se guardan todas o ninguna; si algún horario choca se responde 409 con
+    la lista de horarios ocupados para que el cliente los ajuste.
+    """
+    if (batch.slots is None) == (batch.recurrence is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Envíe 'slots' o 'recurrence' (solo uno)"
+        )
+    
+    try:
+        slots = batch.slots if batch.slots is not None else expand_recurrence(batch.recurrence)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    try:
+        slot_dates = [datetime.strptime(slot.date, '%Y-%m-%d').date() for slot in slots]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
+    
+    if not slots or len(slots) > MAX_BATCH_SLOTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote debe tener entre 1 y {MAX_BATCH_SLOTS} horarios"
+        )
+    if min(slot_dates) < date.today():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se pueden hacer reservaciones en fechas pasadas"
+        )
+    
+    court, schedule = await run_storage(get_bookable_court, batch.court_id)
+    invalid = []
+    for slot, slot_date in zip(slots, slot_dates):
+        error = slot_error(schedule, slot_date, slot.time)
+        if error:
+            invalid.append({"date": slot.date, "time": slot.time, "reason": error})
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": "Algunos horarios están fuera del horario de la cancha; no se guardó ninguno",
+                "invalid": invalid
+            }
+        )
+    
+    created_at = datetime.now().isoformat()
+    price = court['price_per_hour']
+    # En forma canónica, para que '9:00' y '09:00' cuenten como el mismo horario del lote
+    reservations = [
+        {
+            'id': str(uuid.uuid4()),
+            'user_id': batch.user_id,
+            'court_id': batch.court_id,
+            'court_name': court['name'],
+            'date': slot_date.isoformat(),
+            'time': slot_time(slot.time),
+            'price': price,
+            'created_at': created_at,
+            'status': 'confirmed'
+        }
+        for slot, slot_date in zip(slots, slot_dates)
+    ]
+    
+    try:
+        await run_storage(book_reservations, reservations)
+    except BatchConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Algunos horarios ya están reservados; no se guardó ninguno",
+                "conflicts": [{"date": d, "time": t} for _, d, t in e.slots]
+            }
+        )
+    
+    return {
+        "count": len(reservations),
+        "reservations": [ReservationResponse(**r) for r in reservations]
+    }
+
+@app.get("/availability")
+async def get_availability(
+    sport_id: str,
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to")
+):
+    """Ocupación por hora de todas las canchas de un deporte en un rango de fechas
+
+    Cada valor es un mapa de bits: el bit h encendido indica que la hora h:00
+    no se puede reservar (ya está reservada o la cancha está cerrada).
+    `courts[court_id][i]` corresponde a `dates[i]`.
+    """
+    try:
+        start = datetime.strptime(from_date, '%Y-%m-%d').date()
+        end = datetime.strptime(to_date, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
+    
+    days = (end - start).days + 1
+    if days < 1 or days > MAX_AVAILABILITY_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango debe abarcar entre 1 y {MAX_AVAILABILITY_DAYS} días"
+        )
+    
+    courts = await run_storage(get_courts_by_sport, sport_id)
+    if not courts:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deporte no encontrado"
+        )
+    
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    return {
+        "sport_id": sport_id,
+        "from": from_date,
+        "to": to_date,
+        "dates": dates,
+        "courts": await run_storage(get_occupancy_grid, [court['id'] for court in courts], dates)
+    }
+
+@app.get("/stats/courts")
+async def get_stats_courts(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to")
+):
+    """Ingreso y ocupación por cancha, deporte y día en un rango de fechas
+    
+    Se calcula con los totales diarios que se actualizan en cada reservación
+    y cancelación, sin recorrer las reservaciones.
+    """
+    try:
+        start = datetime.strptime(from_date, '%Y-%m-%d').date()
+        end = datetime.strptime(to_date, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
+    
+    days = (end - start).days + 1
+    if days < 1 or days > MAX_STATS_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango debe abarcar entre 1 y {MAX_STATS_DAYS} días"
+        )
+    
+    dates = [start + timedelta(days=i) for i in range(days)]
+    return {
+        "from": from_date,
+        "to": to_date,
+        **await run_storage(get_court_stats, dates)
+    }
+
+# Debe declararse antes de /reservations/{court_id}/{date}, que también coincide con esta ruta
+@app.get("/reservations/user/{user_id}")
+async def get_user_reservations(user_id: str, include_archived: bool = False):
+    """Obtiene las reservaciones de un usuario
+    
+    Con `include_archived=true` agrega las de meses ya archivados (más lento:
+    lee los segmentos comprimidos).
+    """
+    reservations = await run_storage(get_reservations_by_user, user_id, include_archived)
+    return reservations
+
+# También antes de /reservations/{court_id}/{date}
+@app.get("/reservations/by-date/{date}")
+async def get_date_reservations(date: str, by_sport: bool = False):
+    """Reservaciones confirmadas de una fecha en todas las canchas (agenda del día)
+
+    Se sirve del índice por fecha: cuesta lo que tenga ese día, no todo el
+    historial. Con `by_sport=true` se agrupan por deporte.
+    """
+    try:
+        date = datetime.strptime(date, '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
+    
+    return await run_storage(get_reservations_by_date, date, by_sport)
 
 @app.get("/reservations/{court_id}/{date}")
 async def get_court_reservations(court_id: str, date: str):
     """Obtiene las reservaciones de una cancha en una fecha específica"""
     try:
-        datetime.strptime(date, '%Y-%m-%d')
+        date = datetime.strptime(date, '%Y-%m-%d').date().isoformat()
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Formato de fecha inválido. Use YYYY-MM-DD"
         )
     
-    reservations = get_reservations_by_court_and_date(court_id, date)
-    return reservations
-
-@app.get("/reservations/user/{user_id}")
-async def get_user_reservations(user_id: str):
-    """Obtiene todas las reservaciones de un usuario"""
-    reservations = get_reservations_by_user(user_id)
+    reservations = await run_storage(get_reservations_by_court_and_date, court_id, date)
     return reservations
 
 @app.get("/reservations")
-async def get_all_reservations():
-    """Obtiene todas las reservaciones del sistema"""
-    if not os.path.exists(RESERVATIONS_FILE):
-        return []
-    
-    reservations = []
-    with open(RESERVATIONS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            reservations.append({
-                'id': row['id'],
-                'user_id': row['user_id'],
-                'court_id': row['court_id'],
-                'court_name': row['court_name'],
-                'date': row['date'],
-                'time': row['time'],
-                'price': int(row['price']),
-                'created_at': row['created_at'],
-                'status': row['status']
-            })
+async def get_all_reservations(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    court_id: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")
+):
+    """Obtiene las reservaciones del sistema, filtradas y paginadas
+    
+    Sin `limit` regresa la lista completa; con `limit` la cabecera
+    X-Next-Cursor trae el valor de `after` para la siguiente página.
+    """
+    # En forma canónica ('2030-1-5' -> '2030-01-05'): el filtro compara textos
+    try:
+        from_date, to_date = (
+            datetime.strptime(value, '%Y-%m-%d').date().isoformat() if value is not None else None
+            for value in (from_date, to_date)
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
     
-    return reservations
+    try:
+        rows = await run_storage(reservation_store.query, after, court_id, status_filter, from_date, to_date)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+    return await run_storage(listing_response, rows, limit, fmt)
 
 @app.delete("/reservations/{reservation_id}")
 async def cancel_reservation(reservation_id: str):
     """Cancela una reservación"""
-    if not os.path.exists(RESERVATIONS_FILE):
+    if not await run_storage(reservation_store.cancel, reservation_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Reservación no encontrada"
         )
     
-    # Leer todas las reservaciones
-    reservations = []
-    found = False
-    
-    with open(RESERVATIONS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['id'] == reservation_id:
-                found = True
-                row['status'] = 'cancelled'
-            reservations.append(row)
-    
-    if not found:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Reservación no encontrada"
-        )
-    
-    # Reescribir el archivo con la reservación cancelada
-    with open(RESERVATIONS_FILE, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=['id', 'user_id', 'court_id', 
-                                                  'court_name', 'date', 'time', 
-                                                  'price', 'created_at', 'status'])
-        writer.writeheader()
-        writer.writerows(reservations)
-    
     return {"message": "Reservación cancelada exitosamente", "reservation_id": reservation_id}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if WEB_WORKERS > 1:
+        # Cada worker importa este módulo por su cuenta
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WEB_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,13 +1,22 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
+import asyncio
 import csv
+import functools
 import os
+import sys
 from datetime import datetime
-import hashlib
 import uuid
 
+# Módulos compartidos entre las apps (carpeta shared/ en la raíz del repo)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.password_hasher import PasswordHasher
+from shared.user_directory import DuplicateEmailError, UserDirectory
+
+from court_catalog import CourtCatalog
+
 app = FastAPI(title="Sistema de Autenticación y Reservas Deportivas")
 
 # Configurar CORS
@@ -23,6 +32,15 @@ app.add_middleware(
 USERS_FILE = "users.csv"
 COURTS_FILE = "courts.csv"
 
+# Usuarios indexados por correo en memoria
+user_directory = UserDirectory(USERS_FILE, ['id', 'name', 'email', 'password', 'created_at'])
+
+# Procesos para scrypt (PASSWORD_HASH_WORKERS, por defecto uno por núcleo)
+password_hasher = PasswordHasher()
+
+# Catálogo de canchas en memoria; se recarga solo si cambia courts.csv
+court_catalog = CourtCatalog(COURTS_FILE)
+
 # Modelos Pydantic
 class UserRegister(BaseModel):
     name: str
@@ -50,10 +68,6 @@ class Court(BaseModel):
     price_per_hour: int
 
 # Funciones auxiliares
-def hash_password(password: str) -> str:
-    """Hashea la contraseña usando SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def initialize_users_csv():
     """Inicializa el archivo CSV de usuarios"""
     if not os.path.exists(USERS_FILE):
@@ -118,49 +132,24 @@ def initialize_courts_csv():
 
 def get_user_by_email(email: str) -> Optional[dict]:
     """Busca un usuario por email en el CSV"""
-    if not os.path.exists(USERS_FILE):
-        return None
-    
-    with open(USERS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['email'].lower() == email.lower():
-                return row
-    return None
+    return user_directory.get(email)
 
 def save_user(user_data: dict):
-    """Guarda un nuevo usuario en el CSV"""
-    with open(USERS_FILE, 'a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            user_data['id'],
-            user_data['name'],
-            user_data['email'],
-            user_data['password'],
-            user_data['created_at']
-        ])
+    """Guarda un nuevo usuario en el CSV; lanza DuplicateEmailError si el correo ya está registrado"""
+    user_directory.add(user_data)
+
+async def run_blocking(func, *args):
+    """Ejecuta una llamada bloqueante fuera del event loop
+
+    Las escrituras en lote esperan a que se escriba su lote; hechas en el
+    loop lo detendrían y cada solicitud formaría un lote de una sola fila.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args))
 
 def get_courts_by_sport(sport_id: str) -> List[dict]:
     """Obtiene todas las canchas de un deporte específico"""
-    if not os.path.exists(COURTS_FILE):
-        return []
-    
-    courts = []
-    with open(COURTS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['sport_id'] == sport_id:
-                courts.append({
-                    'id': row['id'],
-                    'sport_id': row['sport_id'],
-                    'name': row['name'],
-                    'status': row['status'],
-                    'schedule': row['schedule'],
-                    'available_days': row['available_days'],
-                    'features': row['features'],
-                    'price_per_hour': int(row['price_per_hour'])
-                })
-    return courts
+    return court_catalog.by_sport(sport_id)
 
 # Eventos de inicio
 @app.on_event("startup")
@@ -168,10 +157,16 @@ async def startup_event():
     """Inicializa los archivos CSV al arrancar la aplicación"""
     initialize_users_csv()
     initialize_courts_csv()
+    await run_blocking(password_hasher.start)
     print("✅ Sistema iniciado correctamente")
     print(f"📁 Archivo de usuarios: {USERS_FILE}")
     print(f"🏟️  Archivo de canchas: {COURTS_FILE}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detiene los procesos de hashing"""
+    password_hasher.shutdown()
+
 # Endpoints de autenticación
 @app.get("/")
 async def root():
@@ -209,7 +204,7 @@ async def register(user: UserRegister):
         )
     
     user_id = str(uuid.uuid4())
-    hashed_password = hash_password(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     created_at = datetime.now().isoformat()
     
     user_data = {
@@ -220,7 +215,14 @@ async def register(user: UserRegister):
         'created_at': created_at
     }
     
-    save_user(user_data)
+    try:
+        await run_blocking(save_user, user_data)
+    except DuplicateEmailError:
+        # Otro registro con el mismo correo se guardó mientras se calculaba el hash
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El correo electrónico ya está registrado"
+        )
     
     return UserResponse(
         id=user_id,
@@ -240,13 +242,17 @@ async def login(credentials: UserLogin):
             detail="Credenciales incorrectas"
         )
     
-    hashed_password = hash_password(credentials.password)
-    if user['password'] != hashed_password:
+    valid, upgraded_hash = await password_hasher.check(credentials.password, user['password'])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales incorrectas"
         )
     
+    # Los hashes SHA-256 anteriores se reemplazan por scrypt al iniciar sesión
+    if upgraded_hash:
+        await run_blocking(user_directory.update, user['email'], {'password': upgraded_hash})
+    
     return UserResponse(
         id=user['id'],
         name=user['name'],
@@ -257,25 +263,19 @@ async def login(credentials: UserLogin):
 @app.get("/users")
 async def get_all_users():
     """Obtiene todos los usuarios (sin contraseñas)"""
-    if not os.path.exists(USERS_FILE):
-        return []
-    
-    users = []
-    with open(USERS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            users.append({
-                'id': row['id'],
-                'name': row['name'],
-                'email': row['email'],
-                'created_at': row['created_at']
-            })
-    
-    return users
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'email': row['email'],
+            'created_at': row['created_at']
+        }
+        for row in user_directory.all()
+    ]
 
 # Endpoints de canchas
 @app.get("/courts/{sport_id}")
-async def get_courts(sport_id: str):
+async def get_courts(sport_id: str, request: Request):
     """Obtiene todas las canchas de un deporte específico"""
     valid_sports = ['raquetbol', 'tenis', 'padel', 'pickleball', 
                    'voleibol', 'baloncesto', 'badminton', 'squash']
@@ -286,31 +286,12 @@ async def get_courts(sport_id: str):
             detail=f"Deporte no encontrado. Deportes válidos: {', '.join(valid_sports)}"
         )
     
-    courts = get_courts_by_sport(sport_id)
-    return courts
+    return court_catalog.response(request, sport_id)
 
 @app.get("/courts")
-async def get_all_courts():
+async def get_all_courts(request: Request):
     """Obtiene todas las canchas disponibles"""
-    if not os.path.exists(COURTS_FILE):
-        return []
-    
-    courts = []
-    with open(COURTS_FILE, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            courts.append({
-                'id': row['id'],
-                'sport_id': row['sport_id'],
-                'name': row['name'],
-                'status': row['status'],
-                'schedule': row['schedule'],
-                'available_days': row['available_days'],
-                'features': row['features'],
-                'price_per_hour': int(row['price_per_hour'])
-            })
-    
-    return courts
+    return court_catalog.response(request)
 
 if __name__ == "__main__":
     import uvicorn
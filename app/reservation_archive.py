@@ -0,0 +1,107 @@
+import csv
+import gzip
+import io
+import os
+import re
+from typing import Dict, Iterator, List, Tuple
+
+from reservation_store import partition_of
+from reservation_table import RESERVATION_FIELDS
+
+TOTALS_FIELDS = ['date', 'court_id', 'reservations', 'revenue']
+TOTALS_FILE = 'daily_totals.csv'
+
+_SEGMENT_RE = re.compile(r'^(\d{4}-\d{2})\.csv\.gz$')
+
+
+class ReservationArchive:
+    """Reservaciones de meses pasados, un segmento gzip por mes.
+
+    `<directorio>/2025-03.csv.gz` guarda las reservaciones con fecha en marzo
+    de 2025 y `daily_totals.csv` sus totales diarios por cancha, para que las
+    estadísticas no tengan que abrir los segmentos. Los segmentos no se
+    modifican; archivar de nuevo un mes agrega otro miembro gzip al final,
+    que gzip lee como continuación del mismo archivo.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _segment_path(self, month: str) -> str:
+        return os.path.join(self.directory, f"{month}.csv.gz")
+
+    def months(self) -> List[str]:
+        """Meses archivados, en orden"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(m.group(1) for m in map(_SEGMENT_RE.match, os.listdir(self.directory)) if m)
+
+    def rows(self, month: str) -> Iterator[dict]:
+        """Reservaciones de un mes archivado (vacío si no está archivado)"""
+        path = self._segment_path(month)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as file:
+            for values in csv.reader(file):
+                if values:
+                    row = dict(zip(RESERVATION_FIELDS, values))
+                    row['price'] = int(row['price'])
+                    yield row
+
+    def by_court_and_date(self, court_id: str, date_str: str) -> List[dict]:
+        """Reservaciones confirmadas de una cancha en una fecha; solo abre el segmento de ese mes"""
+        return [
+            row for row in self.rows(partition_of(date_str))
+            if row['court_id'] == court_id and row['date'] == date_str and row['status'] == 'confirmed'
+        ]
+
+    def by_date(self, date_str: str) -> List[dict]:
+        """Reservaciones confirmadas de una fecha en todas las canchas; solo abre el segmento de ese mes"""
+        return [
+            row for row in self.rows(partition_of(date_str))
+            if row['date'] == date_str and row['status'] == 'confirmed'
+        ]
+
+    def by_user(self, user_id: str) -> List[dict]:
+        """Reservaciones archivadas de un usuario, del mes más antiguo al más reciente"""
+        return [row for month in self.months() for row in self.rows(month) if row['user_id'] == user_id]
+
+    def daily_totals(self) -> Iterator[Tuple[str, str, int, int]]:
+        """(fecha, cancha, reservaciones confirmadas, ingreso) de los meses archivados"""
+        path = os.path.join(self.directory, TOTALS_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                yield row['date'], row['court_id'], int(row['reservations']), int(row['revenue'])
+
+    def append(self, rows: List[dict]):
+        """Agrega reservaciones a los segmentos de sus meses, con sus totales diarios
+
+        Se escribe primero cada segmento y al final los totales; quien llame
+        debe quitar las filas del CSV activo solo después de esto.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        by_month: Dict[str, List[dict]] = {}
+        totals: Dict[Tuple[str, str], List[int]] = {}
+        for row in rows:
+            by_month.setdefault(partition_of(row['date']), []).append(row)
+            if row['status'] == 'confirmed':
+                day = totals.setdefault((row['date'], row['court_id']), [0, 0])
+                day[0] += 1
+                day[1] += row['price']
+
+        for month, month_rows in sorted(by_month.items()):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row[field] for field in RESERVATION_FIELDS] for row in month_rows)
+            with gzip.open(self._segment_path(month), 'at', newline='', encoding='utf-8') as file:
+                file.write(buffer.getvalue())
+
+        path = os.path.join(self.directory, TOTALS_FILE)
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(TOTALS_FIELDS)
+            for (date_str, court_id), (count, revenue) in sorted(totals.items()):
+                writer.writerow([date_str, court_id, count, revenue])
@@ -0,0 +1,100 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Union
+
+SNAPSHOT_MAGIC = b'RSVSNAP4'
+# magic, orden de bytes (0 = little, 1 = big), generación de compactación del
+# CSV, bytes cubiertos del CSV y del log de eventos, eventos pendientes de
+# compactar, número de secciones
+_HEADER = struct.Struct('<8sBxxxxxxxQQQQQ')
+# Cada sección: largo del nombre, tipo (typecode de array o 's' para textos) y
+# largo en bytes; luego el nombre y los datos, alineados a 8 bytes
+_SECTION = struct.Struct('<HcxxxxxQ')
+# Separador de los textos de una sección (no aparece en ids, fechas ni nombres)
+_SEP = '\0'
+
+Section = Union[array, List[str]]
+
+
+class SnapshotHeader(NamedTuple):
+    generation: int
+    csv_offset: int
+    events_offset: int
+    pending_events: int
+
+
+class Snapshot(NamedTuple):
+    header: SnapshotHeader
+    # nombre -> arreglo (o lista de textos) tal como se guardó
+    sections: Dict[str, Section]
+
+
+def _pad(length: int) -> int:
+    return -length % 8
+
+
+def write_snapshot(path: str, sections: Dict[str, Section], header: SnapshotHeader):
+    """Escribe las secciones con nombre; reemplaza el archivo de forma atómica
+
+    Los arreglos se escriben tal cual están en memoria. Lanza ValueError si
+    algún texto contiene el separador (la sección no se podría volver a
+    partir); en ese caso no se escribe nada.
+    """
+    encoded = []
+    for name, values in sections.items():
+        if isinstance(values, array):
+            encoded.append((name.encode('utf-8'), values.typecode.encode('ascii'), values.tobytes()))
+            continue
+        text = _SEP.join(values)
+        if text.count(_SEP) != max(len(values) - 1, 0):
+            raise ValueError("Un valor contiene el separador de la instantánea")
+        # Un primer separador distingue la lista vacía de la lista con un texto vacío
+        encoded.append((name.encode('utf-8'), b's', (_SEP + text if values else '').encode('utf-8')))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, sys.byteorder == 'big', *header, len(encoded)))
+        for name, kind, data in encoded:
+            f.write(_SECTION.pack(len(name), kind, len(data)))
+            f.write(name + b'\0' * _pad(len(name)))
+            f.write(data)
+            f.write(b'\0' * _pad(len(data)))
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[Snapshot]:
+    """Lee una instantánea con mmap; None si no existe o no es de este formato
+
+    Cada arreglo se copia de un solo golpe desde el archivo (sin convertir
+    valor por valor).
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, big_endian, *fields, count = _HEADER.unpack_from(mm, 0)
+            if magic != SNAPSHOT_MAGIC or big_endian != (sys.byteorder == 'big'):
+                return None
+            sections = {}
+            position = _HEADER.size
+            for _ in range(count):
+                name_length, kind, length = _SECTION.unpack_from(mm, position)
+                position += _SECTION.size
+                name = mm[position:position + name_length].decode('utf-8')
+                position += name_length + _pad(name_length)
+                data = mm[position:position + length]
+                position += length + _pad(length)
+                if kind == b's':
+                    sections[name] = data.decode('utf-8').split(_SEP)[1:]
+                else:
+                    values = array(kind.decode('ascii'))
+                    values.frombytes(data)
+                    sections[name] = values
+    return Snapshot(SnapshotHeader(*fields), sections)
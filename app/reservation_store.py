@@ -0,0 +1,611 @@
+import bisect
+import csv
+import gc
+import io
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from reservation_snapshot import Snapshot, SnapshotHeader, read_snapshot, write_snapshot
+from reservation_table import RESERVATION_FIELDS, ReservationTable
+from shared.group_commit import DEFAULT_FSYNC, GroupCommitWriter
+from shared.metrics import time_storage
+
+EVENT_FIELDS = ['reservation_id', 'status', 'changed_at']
+
+# Eventos acumulados antes de consolidarlos en el CSV de reservaciones
+DEFAULT_COMPACT_THRESHOLD = 500
+# Bytes que se leen por bloque al cargar los CSV
+CHUNK_SIZE = 1 << 20
+# Tamaño aproximado de una fila del CSV, para reservar el índice de ids al cargar
+ROW_BYTES_ESTIMATE = 120
+
+# (inode, mtime, tamaño) de cada archivo; None si no existe
+Signature = Optional[Tuple[int, int, int]]
+
+
+def file_signature(path: str) -> Signature:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def read_rows(file, offset: int, header: Optional[List[str]], handle) -> Tuple[int, List[str]]:
+    """Pasa a `handle` cada fila completa de `file` (binario) a partir de `offset`
+
+    Si `offset` es 0 la primera fila es el encabezado. Una fila a medio
+    escribir por otro proceso se deja para la siguiente lectura. Regresa el
+    offset tras la última fila completa y el encabezado.
+    """
+    file.seek(offset)
+    pending = b''
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        data = pending + chunk
+        end = data.rfind(b'\n') + 1
+        pending = data[end:]
+        if end == 0:
+            continue
+        reader = csv.reader(io.StringIO(data[:end].decode('utf-8'), newline=''))
+        if offset == 0:
+            header = next(reader, None) or header
+        for values in reader:
+            if values:
+                handle(dict(zip(header, values)))
+        offset += end
+    return offset, header
+
+
+@contextmanager
+def gc_paused():
+    """Pausa el recolector de ciclos mientras se crean millones de objetos que no forman ciclos"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def partition_of(date_str: str) -> str:
+    """Mes (YYYY-MM) al que pertenece una fecha YYYY-MM-DD"""
+    return date_str[:7]
+
+
+class SlotConflictError(Exception):
+    """El horario (cancha, fecha, hora) ya tiene una reservación confirmada"""
+
+    def __init__(self, court_id: str, date_str: str, time: str):
+        super().__init__(f"{court_id} {date_str} {time} ya está reservado")
+        self.court_id = court_id
+        self.date = date_str
+        self.time = time
+
+
+class BatchConflictError(Exception):
+    """Uno o más horarios de un lote ya están ocupados (o se repiten en el lote)"""
+
+    def __init__(self, slots: List[Tuple[str, str, str]]):
+        super().__init__(f"{len(slots)} horario(s) ya reservado(s)")
+        self.slots = slots
+
+
+def find_conflicts(rows: List[dict], has_conflict) -> List[Tuple[str, str, str]]:
+    """Horarios confirmados del lote que ya están ocupados o que aparecen dos veces"""
+    seen = set()
+    conflicts = []
+    for row in rows:
+        if row['status'] != 'confirmed':
+            continue
+        slot = (row['court_id'], row['date'], row['time'])
+        if slot in seen or has_conflict(*slot):
+            conflicts.append(slot)
+        seen.add(slot)
+    return conflicts
+
+
+class ReservationStore:
+    """Mantiene las reservaciones en memoria con índices por cancha/fecha, usuario e id.
+
+    El CSV se lee una sola vez al arrancar; después cada escritura actualiza
+    el archivo y los índices, así que las consultas no vuelven a recorrerlo.
+    Los cambios de estado (cancelaciones) no reescriben el CSV: se agregan al
+    log de eventos y se consolidan en el CSV al llegar a `compact_threshold`.
+    Las filas viven en una ReservationTable (columnas codificadas), no como
+    un dict por reservación; las consultas regresan dicts nuevos.
+
+    Con `shared=True` varios procesos (workers) usan los mismos archivos:
+    cada escritura toma el candado entre procesos, lee primero lo que hayan
+    agregado los demás y revisa los choques ya al día; cada lectura compara
+    inode, fecha y tamaño de los archivos (un `stat` por archivo) y la
+    generación de compactación y, si cambiaron, lee solo las filas nuevas o
+    recarga todo si otro proceso compactó (subió la generación).
+
+    Con un `archive` (ReservationArchive) los meses pasados se pueden mover a
+    segmentos gzip por mes con `archive_before`; ya no se cargan en memoria y
+    las consultas por fecha de esos meses abren solo el segmento del mes.
+
+    Con `snapshot_path`, `save_snapshot` guarda las columnas e índices de la
+    tabla junto con hasta qué byte del CSV y del log cubren y la generación
+    de compactación (contador del `.lock` del CSV); al cargar se copian tal
+    cual y del CSV solo se leen las filas agregadas después. Si el CSV se
+    compactó desde entonces (otra generación) se carga el CSV completo.
+    """
+
+    def __init__(self, path: str, events_path: str,
+                 compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+                 shared: bool = False, archive=None,
+                 snapshot_path: Optional[str] = None):
+        self.path = path
+        self.events_path = events_path
+        self.compact_threshold = compact_threshold
+        self.shared = shared
+        self.archive = archive
+        self.snapshot_path = snapshot_path
+        # Último mes archivado (YYYY-MM); las fechas hasta ese mes se buscan en el archivo
+        self._archived_through = ''
+        self._pending_events = 0
+        self._writer = GroupCommitWriter(path)
+        # Candado entre procesos del CSV de reservaciones (el mismo del escritor en lote)
+        self._file_lock = self._writer.exclusive()
+        self._lock = threading.RLock()
+        self._header: List[str] = list(RESERVATION_FIELDS)
+        # Bytes ya leídos de cada archivo, su firma y la generación en ese momento
+        self._offset = 0
+        self._events_offset = 0
+        self._signature: Tuple[Signature, Signature] = (None, None)
+        self._generation = 0
+        self._table = ReservationTable()
+
+    def load(self):
+        """Reconstruye los índices desde la instantánea (si sigue vigente) o desde el CSV"""
+        with self._lock, self._file_lock, time_storage('scan', self.path), gc_paused():
+            self._pending_events = 0
+            self._header = list(RESERVATION_FIELDS)
+            self._offset = self._events_offset = 0
+            if self.archive:
+                self._archived_through = max(self.archive.months(), default='')
+
+            snapshot = self._valid_snapshot()
+            if snapshot:
+                # Lo que cubre la instantánea ya está indexado (con los totales
+                # del archivo de ese momento); solo se lee lo posterior
+                self._load_snapshot(snapshot)
+                with open(self.path, 'rb') as file:
+                    self._header = next(csv.reader([file.readline().decode('utf-8')]))
+            else:
+                self._table = ReservationTable()
+                if os.path.exists(self.path):
+                    self._table.reserve(os.path.getsize(self.path) // ROW_BYTES_ESTIMATE)
+                if self.archive:
+                    for totals in self.archive.daily_totals():
+                        self._table.add_totals(*totals)
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as file:
+                    self._offset, self._header = read_rows(file, self._offset, self._header, self._load_row)
+
+            if os.path.exists(self.events_path):
+                with open(self.events_path, 'rb') as file:
+                    self._events_offset, _ = read_rows(file, self._events_offset, EVENT_FIELDS, self._load_event)
+            else:
+                self._file_lock.bump_generation()
+                self._reset_events()
+            self._signature = (file_signature(self.path), file_signature(self.events_path))
+            self._generation = self._file_lock.generation()
+
+    def _valid_snapshot(self) -> Optional[Snapshot]:
+        """La instantánea, si es de la misma generación del CSV y los archivos solo crecieron"""
+        if not self.snapshot_path:
+            return None
+        snapshot = read_snapshot(self.snapshot_path)
+        csv_signature, events_signature = file_signature(self.path), file_signature(self.events_path)
+        if snapshot is None or csv_signature is None or events_signature is None:
+            return None
+        header = snapshot.header
+        if (header.generation != self._file_lock.generation()
+                or csv_signature[2] < header.csv_offset or events_signature[2] < header.events_offset):
+            return None
+        return snapshot
+
+    def _load_snapshot(self, snapshot: Snapshot):
+        self._table = ReservationTable.from_sections(snapshot.sections)
+        self._offset = snapshot.header.csv_offset
+        self._events_offset = snapshot.header.events_offset
+        self._pending_events = snapshot.header.pending_events
+
+    def save_snapshot(self) -> bool:
+        """Guarda la tabla en memoria (columnas e índices) como instantánea
+
+        Las secciones se copian bajo el candado junto con el tamaño del CSV y
+        del log; la escritura se hace fuera para no detener las escrituras.
+        Regresa False si no se pudo escribir (la instantánea anterior queda).
+        """
+        if not self.snapshot_path:
+            return False
+        with self._lock, self._file_lock:
+            if self.shared:
+                self._catch_up()
+            sections = {name: values[:] for name, values in self._table.sections().items()}
+            csv_signature, events_signature = file_signature(self.path), file_signature(self.events_path)
+            generation = self._file_lock.generation()
+            pending_events = self._pending_events
+        if csv_signature is None or events_signature is None:
+            return False
+
+        # Si se compacta mientras se escribe, la generación ya no coincide y no se usa
+        header = SnapshotHeader(generation, csv_signature[2], events_signature[2], pending_events)
+        try:
+            with time_storage('snapshot', self.snapshot_path):
+                write_snapshot(self.snapshot_path, sections, header)
+        except ValueError:
+            return False
+        return True
+
+    def _load_row(self, row: dict):
+        # Ya está en el archivo: quedó en el CSV si el proceso se detuvo a media archivación
+        if self._is_archived(row['date']):
+            return
+        row['price'] = int(row['price'])
+        try:
+            self._table.append(row)
+        except ValueError:
+            # Una compactación concurrente con una escritura en lote (o la relectura
+            # de lo que este mismo proceso escribió) puede repetir la fila
+            pass
+
+    def _load_event(self, event: dict):
+        self._apply_status(event['reservation_id'], event['status'])
+        self._pending_events += 1
+
+    def _is_archived(self, date_str: str) -> bool:
+        return bool(self._archived_through) and partition_of(date_str) <= self._archived_through
+
+    def refresh(self):
+        """Incorpora lo que otros procesos hayan escrito (solo con `shared`)"""
+        if not self.shared:
+            return
+        if ((file_signature(self.path), file_signature(self.events_path)) == self._signature
+                and self._file_lock.generation() == self._generation):
+            return
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self):
+        """Lee las filas y eventos nuevos; recarga todo si otro proceso compactó"""
+        reload = False
+        with time_storage('scan', self.path):
+            try:
+                with open(self.path, 'rb') as file, open(self.events_path, 'rb') as events:
+                    # Firma de lo que se abrió: si otro proceso compacta a la mitad, esto no cambia
+                    signature = (self._fstat(file), self._fstat(events))
+                    # Se lee después de abrir: la generación sube antes de reemplazar los
+                    # archivos, así que si se abrieron los nuevos aquí ya se ve la nueva
+                    generation = self._file_lock.generation()
+                    if signature == self._signature and generation == self._generation:
+                        return
+                    (_, _, size), (_, _, events_size) = signature
+                    if (generation != self._generation or None in self._signature
+                            or size < self._offset or events_size < self._events_offset):
+                        reload = True
+                    else:
+                        self._offset, _ = read_rows(file, self._offset, self._header, self._load_row)
+                        self._events_offset, _ = read_rows(events, self._events_offset, EVENT_FIELDS, self._load_event)
+                        self._signature = signature
+            except FileNotFoundError:
+                reload = True
+        if reload:
+            self.load()
+
+    @staticmethod
+    def _fstat(file) -> Signature:
+        stat = os.fstat(file.fileno())
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def add(self, reservation_data: dict):
+        """Agrega la reservación a los índices y al CSV
+
+        Lanza SlotConflictError si el horario ya está ocupado. La fila se
+        indexa primero (apartando el horario) y luego se escribe en lote con
+        las de otras solicitudes; si la escritura falla se quita del índice.
+        """
+        row = {field: reservation_data[field] for field in RESERVATION_FIELDS}
+        row['price'] = int(row['price'])
+        if self.shared:
+            try:
+                self._append_shared([row])
+            except BatchConflictError:
+                raise SlotConflictError(row['court_id'], row['date'], row['time'])
+            return
+
+        with self._lock:
+            if row['status'] == 'confirmed' and self.has_conflict(row['court_id'], row['date'], row['time']):
+                raise SlotConflictError(row['court_id'], row['date'], row['time'])
+            index = self._table.append(row)
+
+        try:
+            self._writer.write_row([row[field] for field in RESERVATION_FIELDS])
+        except Exception:
+            with self._lock:
+                self._table.kill(index)
+            raise
+
+    def add_many(self, reservations: List[dict]):
+        """Agrega varias reservaciones de una vez: todas o ninguna
+
+        Revisa todos los horarios contra el índice en una sola pasada (bajo el
+        candado) y lanza BatchConflictError con los que chocan; si no hay
+        choques las indexa y las escribe juntas en una sola escritura.
+        """
+        rows = []
+        for reservation_data in reservations:
+            row = {field: reservation_data[field] for field in RESERVATION_FIELDS}
+            row['price'] = int(row['price'])
+            rows.append(row)
+
+        if self.shared:
+            self._append_shared(rows)
+            return
+
+        with self._lock:
+            conflicts = find_conflicts(rows, self.has_conflict)
+            if conflicts:
+                raise BatchConflictError(conflicts)
+            indexes = [self._table.append(row) for row in rows]
+
+        try:
+            self._writer.write_rows([[row[field] for field in RESERVATION_FIELDS] for row in rows])
+        except Exception:
+            with self._lock:
+                for index in indexes:
+                    self._table.kill(index)
+            raise
+
+    def _append_shared(self, rows: List[dict]):
+        """Escribe filas en modo compartido: todas o ninguna, sin lote entre solicitudes
+
+        Bajo el candado entre procesos se incorporan primero las filas de los
+        demás workers, así que la revisión de choques ve todos los horarios.
+        """
+        with self._lock, self._file_lock:
+            self._catch_up()
+            conflicts = find_conflicts(rows, self.has_conflict)
+            if conflicts:
+                raise BatchConflictError(conflicts)
+
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row[field] for field in self._header] for row in rows)
+            with time_storage('append', self.path), open(self.path, 'a', newline='', encoding='utf-8') as file:
+                file.write(buffer.getvalue())
+                if DEFAULT_FSYNC:
+                    file.flush()
+                    os.fsync(file.fileno())
+            for row in rows:
+                self._table.append(row)
+            self._mark_read()
+
+    def _mark_read(self):
+        """Da por leídos ambos archivos tal como están (solo con el candado entre procesos)"""
+        self._signature = (file_signature(self.path), file_signature(self.events_path))
+        self._generation = self._file_lock.generation()
+        self._offset = self._signature[0][2] if self._signature[0] else 0
+        self._events_offset = self._signature[1][2] if self._signature[1] else 0
+
+    def get(self, reservation_id: str) -> Optional[dict]:
+        """Obtiene una reservación por id"""
+        self.refresh()
+        with self._lock:
+            index = self._table.find(reservation_id)
+            return self._table.row(index) if index >= 0 and self._table.live[index] else None
+
+    def by_court_and_date(self, court_id: str, date_str: str) -> List[dict]:
+        """Reservaciones confirmadas de una cancha en una fecha
+
+        Si la fecha cae en un mes archivado solo se abre el segmento de ese mes.
+        """
+        self.refresh()
+        if self._is_archived(date_str):
+            return self.archive.by_court_and_date(court_id, date_str)
+        with self._lock:
+            table = self._table
+            return [table.row(i) for i in table.day_rows(court_id, date_str) if table.is_confirmed(i)]
+
+    def by_date(self, date_str: str) -> List[dict]:
+        """Reservaciones confirmadas de una fecha en todas las canchas, por hora y cancha
+
+        Usa el índice por fecha: el costo depende de las reservaciones de ese
+        día, no del historial. Un mes archivado se lee de su segmento.
+        """
+        self.refresh()
+        if self._is_archived(date_str):
+            rows = self.archive.by_date(date_str)
+        else:
+            with self._lock:
+                table = self._table
+                rows = [table.row(i) for i in table.date_rows(date_str) if table.is_confirmed(i)]
+        return sorted(rows, key=lambda row: (row['time'], row['court_id']))
+
+    def by_user(self, user_id: str, include_archived: bool = False) -> List[dict]:
+        """Reservaciones de un usuario; con `include_archived` también las de meses archivados"""
+        self.refresh()
+        archived = self.archive.by_user(user_id) if include_archived and self.archive else []
+        with self._lock:
+            return archived + [self._table.row(i) for i in self._table.user_rows(user_id)]
+
+    def all(self) -> List[dict]:
+        """Todas las reservaciones en el orden en que se crearon"""
+        self.refresh()
+        with self._lock:
+            return [self._table.row(i) for i in self._table.live_rows()]
+
+    def query(self, after: Optional[str] = None, court_id: Optional[str] = None,
+              status: Optional[str] = None, date_from: Optional[str] = None,
+              date_to: Optional[str] = None) -> Iterator[dict]:
+        """Recorre las reservaciones en orden de creación aplicando filtros
+
+        `after` es el id de la última reservación ya entregada; lanza KeyError
+        si no existe. Con `date_from`/`date_to` solo se recorren las filas de
+        las fechas del rango (índice por fecha) y con `court_id` las de la
+        cancha; el estado se revisa fila por fila. Las filas se generan una a
+        una para poder transmitirlas.
+        """
+        self.refresh()
+        table = self._table
+        if date_from or date_to:
+            with self._lock:
+                rows = table.range_rows(date_from, date_to, court_id)
+        else:
+            rows = table.court_rows(court_id) if court_id else range(len(table))
+        start = 0
+        if after is not None:
+            index = table.find(after)
+            if index < 0:
+                raise KeyError(after)
+            start = bisect.bisect_right(rows, index)
+        return self._scan(table, rows, start, len(rows), status)
+
+    @staticmethod
+    def _scan(table: ReservationTable, rows, start: int, end: int, status: Optional[str]) -> Iterator[dict]:
+        # El estado se compara por código; un estado que nadie tiene no regresa filas
+        status_code = table.dictionaries['status'].find(status) if status else None
+        if status_code == -1:
+            return
+        statuses = table.codes['status']
+        for i in range(start, end):
+            index = rows[i]
+            if not table.live[index]:
+                continue
+            if status_code is not None and statuses[index] != status_code:
+                continue
+            yield table.row(index)
+
+    def has_conflict(self, court_id: str, date_str: str, time: str) -> bool:
+        """Indica si el horario ya tiene una reservación confirmada"""
+        self.refresh()
+        with self._lock:
+            return self._table.has_conflict(court_id, date_str, time)
+
+    def occupancy(self, court_id: str, date_str: str) -> int:
+        """Mapa de bits de las horas ocupadas de una cancha en una fecha"""
+        self.refresh()
+        return self._table.occupied(court_id, date_str)
+
+    def daily_totals(self, date_from: str, date_to: str) -> List[dict]:
+        """Reservaciones confirmadas e ingreso por día y cancha, ya sumados
+
+        Solo se consultan los totales de cada fecha del rango; no se recorren
+        las reservaciones.
+        """
+        start = date.fromisoformat(date_from)
+        end = date.fromisoformat(date_to)
+        result = []
+        self.refresh()
+        with self._lock:
+            while start <= end:
+                day = start.isoformat()
+                for court_id, count, revenue in self._table.totals(day):
+                    if count:
+                        result.append({'date': day, 'court_id': court_id,
+                                       'reservations': count, 'revenue': revenue})
+                start += timedelta(days=1)
+        return result
+
+    def _apply_status(self, reservation_id: str, new_status: str) -> bool:
+        """Cambia el estado en memoria manteniendo el índice de horarios ocupados"""
+        index = self._table.find(reservation_id)
+        if index < 0 or not self._table.live[index]:
+            return False
+        self._table.set_status(index, new_status)
+        return True
+
+    def set_status(self, reservation_id: str, new_status: str) -> bool:
+        """Registra un cambio de estado como evento; regresa False si no existe"""
+        with self._lock, self._file_lock if self.shared else nullcontext():
+            if self.shared:
+                self._catch_up()
+            if not self._apply_status(reservation_id, new_status):
+                return False
+
+            with time_storage('append', self.events_path), open(self.events_path, 'a', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow([reservation_id, new_status, datetime.now().isoformat()])
+            self._pending_events += 1
+            if self.shared:
+                self._mark_read()
+
+            if self._pending_events >= self.compact_threshold:
+                self.compact()
+            return True
+
+    def cancel(self, reservation_id: str) -> bool:
+        """Marca una reservación como cancelada; regresa False si no existe"""
+        return self.set_status(reservation_id, 'cancelled')
+
+    def compact(self):
+        """Consolida los eventos en el CSV de reservaciones y vacía el log"""
+        with self._lock, self._file_lock, time_storage('rewrite', self.path):
+            if self.shared:
+                # Sin esto se perderían las filas de otros workers aún no leídas
+                self._catch_up()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=RESERVATION_FIELDS)
+                writer.writeheader()
+                writer.writerows(self._table.row(i) for i in self._table.live_rows())
+            # Antes del reemplazo: quien vea el CSV nuevo ya ve la generación nueva
+            self._file_lock.bump_generation()
+            if self.snapshot_path:
+                try:
+                    os.remove(self.snapshot_path)
+                except FileNotFoundError:
+                    pass
+            # Reemplazo atómico: si se interrumpe, los eventos se vuelven a aplicar al cargar
+            os.replace(tmp_path, self.path)
+            self._reset_events()
+            self._mark_read()
+
+    def archive_before(self, month: str) -> int:
+        """Mueve al archivo las reservaciones con fecha anterior a `month` (YYYY-MM)
+
+        Escribe los segmentos por mes y luego compacta el CSV sin esas filas;
+        regresa cuántas se archivaron. Sus totales diarios se conservan.
+        """
+        if self.archive is None:
+            raise ValueError("El almacén no tiene archivo configurado")
+        with self._lock, self._file_lock:
+            if self.shared:
+                self._catch_up()
+            table = self._table
+            old = [i for i in table.live_rows() if partition_of(table.value(i, 'date')) < month]
+            if not old:
+                return 0
+
+            rows = [table.row(i) for i in old]
+            with time_storage('archive', self.path):
+                self.archive.append(rows)
+            for index in old:
+                # Los totales del día siguen contando la reservación archivada
+                table.kill(index, keep_totals=True)
+            self._archived_through = max(self._archived_through, max(partition_of(row['date']) for row in rows))
+            self.compact()
+            return len(old)
+
+    def _reset_events(self):
+        """Deja el log de eventos solo con el encabezado
+
+        Se reemplaza en lugar de truncarlo: quien lo tenga abierto sigue
+        leyendo el log viejo completo. Los demás procesos notan la compactación
+        por la generación, que sube antes.
+        """
+        tmp_path = self.events_path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(EVENT_FIELDS)
+        os.replace(tmp_path, self.events_path)
+        self._pending_events = 0
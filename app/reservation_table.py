@@ -0,0 +1,516 @@
+import uuid
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+RESERVATION_FIELDS = ['id', 'user_id', 'court_id', 'court_name', 'date',
+                      'time', 'price', 'created_at', 'status']
+# Columnas que se guardan como código de diccionario
+CODED_FIELDS = ('user_id', 'court_id', 'court_name', 'date', 'time', 'status')
+
+# created_at que no se puede reproducir con isoformat() se guarda aparte
+_NO_TIMESTAMP = -(1 << 63)
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Siguiente tipo de arreglo cuando un valor ya no cabe
+_WIDER = {'B': 'H', 'H': 'I', 'I': 'Q', 'i': 'q'}
+# Los uuid se guardan en 16 bytes; un texto de 16 bytes lleva este prefijo para no
+# confundirse (0xff nunca aparece en UTF-8)
+_TEXT_PREFIX = b'\xff'
+
+
+def slot_bit(time: str) -> int:
+    """Bit del horario en el mapa de ocupación del día (bit h = hora h:00)"""
+    try:
+        hour = int(time.split(':')[0])
+    except ValueError:
+        return 0
+    return 1 << hour if 0 <= hour < 24 else 0
+
+
+def encode_timestamp(value: str) -> int:
+    """'2025-01-01T10:00:00.123456' -> microsegundos desde 1970 (_NO_TIMESTAMP si no regresa igual)"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return _NO_TIMESTAMP
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return _NO_TIMESTAMP
+    return (moment - _EPOCH) // _MICROSECOND
+
+
+def decode_timestamp(micros: int) -> str:
+    return (_EPOCH + micros * _MICROSECOND).isoformat()
+
+
+def encode_text(value: str) -> bytes:
+    """Un uuid en su forma canónica ocupa 16 bytes; cualquier otro texto, su UTF-8"""
+    if len(value) == 36:
+        try:
+            packed = uuid.UUID(value)
+        except ValueError:
+            pass
+        else:
+            if str(packed) == value:
+                return packed.bytes
+    data = value.encode('utf-8')
+    return _TEXT_PREFIX + data if len(data) == 16 else data
+
+
+def decode_text(data: bytes) -> str:
+    if len(data) == 16:
+        return str(uuid.UUID(bytes=bytes(data)))
+    if data.startswith(_TEXT_PREFIX):
+        data = data[1:]
+    return data.decode('utf-8')
+
+
+def _widened(values: array) -> array:
+    """Copia del arreglo con el siguiente tamaño de entero"""
+    return array(_WIDER[values.typecode], values)
+
+
+class StringDictionary:
+    """Valores distintos de una columna con pocos valores (canchas, fechas, horas, estados)
+
+    Cada valor se guarda una sola vez; las filas guardan su código.
+    """
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = values or []
+        self._codes: Dict[str, int] = dict(zip(self.values, range(len(self.values))))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+    def find(self, value: str) -> int:
+        return self._codes.get(value, -1)
+
+    def code(self, value: str) -> int:
+        """Código del valor; lo agrega si es nuevo"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def sections(self, name: str) -> dict:
+        return {name: self.values}
+
+    @classmethod
+    def from_sections(cls, sections: dict, name: str) -> 'StringDictionary':
+        return cls(sections[name])
+
+
+class PackedStrings:
+    """Textos distintos empaquetados en un solo bytearray, con índice hash propio
+
+    Para columnas con muchos valores distintos (ids de reservación y de
+    usuario): cada texto cuesta sus bytes (16 si es un uuid), 4 de offset y
+    unos 8 de tabla (direccionamiento abierto con crc32), en lugar de un
+    objeto str y una entrada de dict. El hash es estable entre procesos, así
+    que la tabla se guarda tal cual en la instantánea.
+    """
+
+    def __init__(self):
+        self._blob = bytearray()
+        self._offsets = array('I', [0])
+        self._slots = array('i', [-1]) * 8
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return decode_text(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+    def _probe(self, data: bytes) -> Tuple[int, int]:
+        """(posición en la tabla, índice del texto o -1 si no está)"""
+        blob, offsets, slots = self._blob, self._offsets, self._slots
+        mask = len(slots) - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            index = slots[slot]
+            if index < 0 or blob[offsets[index]:offsets[index + 1]] == data:
+                return slot, index
+            slot = (slot + 1) & mask
+
+    def find(self, value: str) -> int:
+        return self._probe(encode_text(value))[1]
+
+    def code(self, value: str) -> int:
+        """Índice del texto; lo agrega si es nuevo"""
+        data = encode_text(value)
+        slot, index = self._probe(data)
+        if index >= 0:
+            return index
+        index = len(self._offsets) - 1
+        self._blob += data
+        try:
+            self._offsets.append(len(self._blob))
+        except OverflowError:
+            self._offsets = _widened(self._offsets)
+            self._offsets.append(len(self._blob))
+        self._slots[slot] = index
+        # Tabla a lo más 2/3 llena
+        if 3 * (index + 1) > 2 * len(self._slots):
+            self._rehash(2 * len(self._slots))
+        return index
+
+    def reserve(self, count: int):
+        """Agranda la tabla de una vez para `count` textos (evita rehacerla varias veces al cargar)"""
+        size = len(self._slots)
+        while 3 * count > 2 * size:
+            size *= 2
+        if size > len(self._slots):
+            self._rehash(size)
+
+    def _rehash(self, size: int):
+        blob, offsets = self._blob, self._offsets
+        slots = array('i', [-1]) * size
+        mask = size - 1
+        for index in range(len(self)):
+            slot = zlib.crc32(blob[offsets[index]:offsets[index + 1]]) & mask
+            while slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            slots[slot] = index
+        self._slots = slots
+
+    def sections(self, name: str) -> dict:
+        return {f"{name}.blob": array('B', self._blob), f"{name}.offsets": self._offsets,
+                f"{name}.slots": self._slots}
+
+    @classmethod
+    def from_sections(cls, sections: dict, name: str) -> 'PackedStrings':
+        packed = cls()
+        packed._blob = bytearray(sections[f"{name}.blob"])
+        packed._offsets = sections[f"{name}.offsets"]
+        packed._slots = sections[f"{name}.slots"]
+        return packed
+
+
+class ReservationTable:
+    """Tabla de reservaciones en columnas (`array`) con índices también en arreglos.
+
+    Una fila es una posición: el id va empaquetado, user_id, cancha, fecha,
+    hora y estado son códigos de diccionario, el precio es un entero y
+    created_at son microsegundos. Las filas no se borran: `kill` las marca
+    como inactivas y desaparecen en la siguiente carga.
+
+    Cada (cancha, fecha) con reservaciones es un "día" numerado; sus filas
+    forman una lista enlazada (igual que las de cada usuario) y su mapa de
+    horas ocupadas y totales son posiciones en arreglos, sin objetos por
+    día ni por fila. Así la instantánea guarda también los índices y la
+    carga no tiene que recorrer las filas.
+
+    `by_date` lleva de cada fecha a sus días, así que lo de una fecha en
+    todas las canchas (o de un rango de fechas) se recorre sin ver otras
+    fechas.
+    """
+
+    def __init__(self):
+        self.ids = PackedStrings()
+        self.dictionaries = {field: StringDictionary() for field in CODED_FIELDS}
+        self.dictionaries['user_id'] = PackedStrings()
+        self.codes: Dict[str, array] = {field: array('B') for field in CODED_FIELDS}
+        self.prices = array('i')
+        self.created = array('q')
+        self.created_text: Dict[int, str] = {}
+        self.live = array('B')
+        # Filas de cada usuario como lista enlazada: primera, última y siguiente
+        self.user_head = array('i')
+        self.user_tail = array('i')
+        self.user_next = array('i')
+        # (cancha, fecha) -> número de día; por día: filas (lista enlazada),
+        # horas ocupadas, reservaciones confirmadas e ingreso
+        self.days: Dict[Tuple[int, int], int] = {}
+        self.day_court = array('I')
+        self.day_date = array('I')
+        self.day_head = array('i')
+        self.day_tail = array('i')
+        self.day_next = array('i')
+        self.day_occupancy = array('I')
+        self.day_count = array('i')
+        self.day_revenue = array('q')
+        # fecha -> sus días (uno por cancha con reservaciones)
+        self.by_date: Dict[int, array] = {}
+        # cancha -> filas en orden (para recorrer con cursor)
+        self.by_court: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def reserve(self, count: int):
+        self.ids.reserve(count)
+
+    # Lectura
+
+    def find(self, reservation_id: str) -> int:
+        """Fila del id (aunque esté inactiva), o -1"""
+        return self.ids.find(reservation_id)
+
+    def value(self, index: int, field: str) -> str:
+        return self.dictionaries[field][self.codes[field][index]]
+
+    def row(self, index: int) -> dict:
+        micros = self.created[index]
+        return {
+            'id': self.ids[index],
+            'user_id': self.value(index, 'user_id'),
+            'court_id': self.value(index, 'court_id'),
+            'court_name': self.value(index, 'court_name'),
+            'date': self.value(index, 'date'),
+            'time': self.value(index, 'time'),
+            'price': self.prices[index],
+            'created_at': decode_timestamp(micros) if micros != _NO_TIMESTAMP else self.created_text[index],
+            'status': self.value(index, 'status')
+        }
+
+    def is_confirmed(self, index: int) -> bool:
+        return self.live[index] and self.value(index, 'status') == 'confirmed'
+
+    def day_of(self, court_id: str, date_str: str) -> int:
+        """Número de día de (cancha, fecha), o -1 si no tiene reservaciones"""
+        court = self.dictionaries['court_id'].find(court_id)
+        day = self.dictionaries['date'].find(date_str)
+        return self.days.get((court, day), -1)
+
+    def day_rows(self, court_id: str, date_str: str) -> Iterator[int]:
+        """Filas activas de una cancha en una fecha, en orden"""
+        return self._linked_rows(self.day_of(court_id, date_str), self.day_head, self.day_next)
+
+    def user_rows(self, user_id: str) -> Iterator[int]:
+        """Filas activas de un usuario, en orden"""
+        return self._linked_rows(self.dictionaries['user_id'].find(user_id), self.user_head, self.user_next)
+
+    def _linked_rows(self, key: int, head: array, following: array) -> Iterator[int]:
+        index = head[key] if key >= 0 else -1
+        while index >= 0:
+            if self.live[index]:
+                yield index
+            index = following[index]
+
+    def date_rows(self, date_str: str) -> Iterator[int]:
+        """Filas activas de una fecha en todas las canchas (cancha por cancha)"""
+        for day in self.by_date.get(self.dictionaries['date'].find(date_str), ()):
+            yield from self._linked_rows(day, self.day_head, self.day_next)
+
+    def range_rows(self, date_from: Optional[str], date_to: Optional[str],
+                   court_id: Optional[str] = None) -> array:
+        """Filas activas con fecha entre `date_from` y `date_to` (incluidas), en orden
+
+        Solo se recorren los días de las fechas del rango (de la cancha, si
+        se indica); las demás fechas no se tocan.
+        """
+        dates = self.dictionaries['date']
+        court = self.dictionaries['court_id'].find(court_id) if court_id else None
+        rows = array('i')
+        for date_code, days in self.by_date.items():
+            date_str = dates[date_code]
+            if (date_from and date_str < date_from) or (date_to and date_str > date_to):
+                continue
+            for day in days:
+                if court is None or self.day_court[day] == court:
+                    rows.extend(self._linked_rows(day, self.day_head, self.day_next))
+        return array('i', sorted(rows))
+
+    def court_rows(self, court_id: str) -> array:
+        """Todas las filas de una cancha (también inactivas), en orden"""
+        court = self.dictionaries['court_id'].find(court_id)
+        return self.by_court.get(court, array('i'))
+
+    def live_rows(self) -> Iterator[int]:
+        live = self.live
+        return (i for i in range(len(live)) if live[i])
+
+    def occupied(self, court_id: str, date_str: str) -> int:
+        day = self.day_of(court_id, date_str)
+        return self.day_occupancy[day] if day >= 0 else 0
+
+    def has_conflict(self, court_id: str, date_str: str, time: str) -> bool:
+        """Horario ocupado por una reservación confirmada con esa misma hora"""
+        if not self.occupied(court_id, date_str) & slot_bit(time):
+            return False
+        time_code = self.dictionaries['time'].find(time)
+        times = self.codes['time']
+        return any(times[i] == time_code and self.is_confirmed(i) for i in self.day_rows(court_id, date_str))
+
+    def totals(self, date_str: str) -> List[Tuple[str, int, int]]:
+        """(cancha, reservaciones confirmadas, ingreso) de una fecha, por cancha"""
+        courts = self.dictionaries['court_id']
+        days = self.by_date.get(self.dictionaries['date'].find(date_str), ())
+        return sorted((courts[self.day_court[day]], self.day_count[day], self.day_revenue[day]) for day in days)
+
+    # Escritura
+
+    def append(self, row: dict) -> int:
+        """Agrega una fila (con price entero) y la indexa; regresa su posición
+
+        Lanza ValueError (sin agregar nada) si el id ya está en la tabla.
+        """
+        index = len(self.prices)
+        if self.ids.code(row['id']) != index:
+            raise ValueError(f"Reservación repetida: {row['id']}")
+        codes, dictionaries = self.codes, self.dictionaries
+        for field in CODED_FIELDS:
+            code = dictionaries[field].code(row[field])
+            try:
+                codes[field].append(code)
+            except OverflowError:
+                codes[field] = _widened(codes[field])
+                codes[field].append(code)
+        try:
+            self.prices.append(row['price'])
+        except OverflowError:
+            self.prices = _widened(self.prices)
+            self.prices.append(row['price'])
+        micros = encode_timestamp(row['created_at'])
+        if micros == _NO_TIMESTAMP:
+            self.created_text[index] = row['created_at']
+        self.created.append(micros)
+        self.live.append(1)
+
+        user = codes['user_id'][index]
+        if user == len(self.user_head):
+            self.user_head.append(index)
+            self.user_tail.append(index)
+        else:
+            self.user_next[self.user_tail[user]] = index
+            self.user_tail[user] = index
+        self.user_next.append(-1)
+
+        court = codes['court_id'][index]
+        day = self._day(court, codes['date'][index])
+        if self.day_head[day] < 0:
+            self.day_head[day] = index
+        else:
+            self.day_next[self.day_tail[day]] = index
+        self.day_tail[day] = index
+        self.day_next.append(-1)
+        rows = self.by_court.get(court)
+        if rows is None:
+            rows = self.by_court[court] = array('i')
+        rows.append(index)
+        if row['status'] == 'confirmed':
+            self.day_occupancy[day] |= slot_bit(row['time'])
+            self.day_count[day] += 1
+            self.day_revenue[day] += row['price']
+        return index
+
+    def _day(self, court: int, date_code: int) -> int:
+        """Número de día de (cancha, fecha); lo crea si no existe"""
+        day = self.days.get((court, date_code))
+        if day is None:
+            day = self.days[(court, date_code)] = len(self.day_head)
+            self.by_date.setdefault(date_code, array('i')).append(day)
+            self.day_court.append(court)
+            self.day_date.append(date_code)
+            self.day_head.append(-1)
+            self.day_tail.append(-1)
+            self.day_occupancy.append(0)
+            self.day_count.append(0)
+            self.day_revenue.append(0)
+        return day
+
+    def _day_of_row(self, index: int) -> int:
+        return self.days[(self.codes['court_id'][index], self.codes['date'][index])]
+
+    def set_status(self, index: int, status: str):
+        confirmed = self.is_confirmed(index)
+        code = self.dictionaries['status'].code(status)
+        try:
+            self.codes['status'][index] = code
+        except OverflowError:
+            self.codes['status'] = _widened(self.codes['status'])
+            self.codes['status'][index] = code
+        if confirmed:
+            self._tally(index, -1)
+            self._release(index)
+        if self.is_confirmed(index):
+            self.day_occupancy[self._day_of_row(index)] |= slot_bit(self.value(index, 'time'))
+            self._tally(index, 1)
+
+    def kill(self, index: int, keep_totals: bool = False):
+        """Marca la fila como inactiva; con `keep_totals` sigue contando en los totales diarios"""
+        if not self.live[index]:
+            return
+        confirmed = self.is_confirmed(index)
+        self.live[index] = 0
+        if confirmed:
+            self._release(index)
+            if not keep_totals:
+                self._tally(index, -1)
+
+    def add_totals(self, date_str: str, court_id: str, count: int, revenue: int):
+        """Suma reservaciones e ingreso a un día (p. ej. los de meses archivados)"""
+        day = self._day(self.dictionaries['court_id'].code(court_id), self.dictionaries['date'].code(date_str))
+        self.day_count[day] += count
+        self.day_revenue[day] += revenue
+
+    def _tally(self, index: int, sign: int):
+        day = self._day_of_row(index)
+        self.day_count[day] += sign
+        self.day_revenue[day] += sign * self.prices[index]
+
+    def _release(self, index: int):
+        """Recalcula las horas ocupadas del día sin la fila (puede haber otra en el mismo horario)"""
+        day = self._day_of_row(index)
+        mask = 0
+        row = self.day_head[day]
+        while row >= 0:
+            if row != index and self.is_confirmed(row):
+                mask |= slot_bit(self.value(row, 'time'))
+            row = self.day_next[row]
+        self.day_occupancy[day] = mask
+
+    # Instantánea
+
+    def sections(self) -> dict:
+        """Columnas e índices como arreglos y listas de textos, para la instantánea"""
+        sections = self.ids.sections('id')
+        for field in CODED_FIELDS:
+            sections.update(self.dictionaries[field].sections(f"{field}.values"))
+            sections[field] = self.codes[field]
+        created_rows = sorted(self.created_text)
+        sections.update({
+            'price': self.prices, 'created': self.created, 'live': self.live,
+            'created_text.rows': array('i', created_rows),
+            'created_text.values': [self.created_text[i] for i in created_rows],
+            'user_head': self.user_head, 'user_tail': self.user_tail, 'user_next': self.user_next,
+            'day_court': self.day_court, 'day_date': self.day_date, 'day_head': self.day_head, 'day_tail': self.day_tail, 'day_next': self.day_next,
+            'day_occupancy': self.day_occupancy, 'day_count': self.day_count, 'day_revenue': self.day_revenue
+        })
+        courts = list(self.by_court)
+        offsets = array('Q', [0])
+        rows = array('i')
+        for court in courts:
+            rows.extend(self.by_court[court])
+            offsets.append(len(rows))
+        sections.update({'by_court.court': array('I', courts), 'by_court.offsets': offsets, 'by_court.rows': rows})
+        return sections
+
+    @classmethod
+    def from_sections(cls, sections: dict) -> 'ReservationTable':
+        table = cls()
+        table.ids = PackedStrings.from_sections(sections, 'id')
+        for field in CODED_FIELDS:
+            kind = PackedStrings if field == 'user_id' else StringDictionary
+            table.dictionaries[field] = kind.from_sections(sections, f"{field}.values")
+            table.codes[field] = sections[field]
+        table.prices = sections['price']
+        table.created = sections['created']
+        table.live = sections['live']
+        table.created_text = dict(zip(sections['created_text.rows'], sections['created_text.values']))
+        for name in ('user_head', 'user_tail', 'user_next', 'day_court', 'day_date', 'day_head', 'day_tail',
+                     'day_next', 'day_occupancy', 'day_count', 'day_revenue'):
+            setattr(table, name, sections[name])
+        table.days = dict(zip(zip(table.day_court, table.day_date), range(len(table.day_head))))
+        for day, date_code in enumerate(table.day_date):
+            table.by_date.setdefault(date_code, array('i')).append(day)
+        offsets, rows = sections['by_court.offsets'], sections['by_court.rows']
+        table.by_court = {court: rows[offsets[n]:offsets[n + 1]]
+                          for n, court in enumerate(sections['by_court.court'])}
+        return table
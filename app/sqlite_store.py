@@ -0,0 +1,418 @@
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+# Módulos compartidos entre las apps (carpeta shared/ en la raíz del repo)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.metrics import time_storage
+from shared.user_directory import DuplicateEmailError
+
+from reservation_archive import ReservationArchive
+from reservation_store import BatchConflictError, SlotConflictError, find_conflicts, partition_of
+from reservation_table import RESERVATION_FIELDS, slot_bit
+
+COURT_FIELDS = ['id', 'sport_id', 'name', 'status', 'schedule',
+                'available_days', 'features', 'price_per_hour']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS courts (
+    id TEXT PRIMARY KEY,
+    sport_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    schedule TEXT NOT NULL,
+    available_days TEXT NOT NULL,
+    features TEXT NOT NULL,
+    price_per_hour INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_courts_sport ON courts(sport_id);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    court_id TEXT NOT NULL,
+    court_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_slot ON reservations(court_id, date, time);
+CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations(user_id);
+CREATE INDEX IF NOT EXISTS idx_reservations_date ON reservations(date, time);
+-- Solo puede haber una reservación confirmada por horario
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reservations_confirmed_slot
+    ON reservations(court_id, date, time) WHERE status = 'confirmed';
+
+-- Totales por día y cancha de las reservaciones confirmadas, mantenidos por triggers
+CREATE TABLE IF NOT EXISTS court_daily_stats (
+    date TEXT NOT NULL,
+    court_id TEXT NOT NULL,
+    reservations INTEGER NOT NULL,
+    revenue INTEGER NOT NULL,
+    PRIMARY KEY (date, court_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_insert AFTER INSERT ON reservations
+WHEN NEW.status = 'confirmed'
+BEGIN
+    INSERT INTO court_daily_stats (date, court_id, reservations, revenue)
+    VALUES (NEW.date, NEW.court_id, 1, NEW.price)
+    ON CONFLICT (date, court_id) DO UPDATE SET
+        reservations = reservations + 1, revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_confirm AFTER UPDATE OF status ON reservations
+WHEN OLD.status != 'confirmed' AND NEW.status = 'confirmed'
+BEGIN
+    INSERT INTO court_daily_stats (date, court_id, reservations, revenue)
+    VALUES (NEW.date, NEW.court_id, 1, NEW.price)
+    ON CONFLICT (date, court_id) DO UPDATE SET
+        reservations = reservations + 1, revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_release AFTER UPDATE OF status ON reservations
+WHEN OLD.status = 'confirmed' AND NEW.status != 'confirmed'
+BEGIN
+    UPDATE court_daily_stats SET reservations = reservations - 1, revenue = revenue - OLD.price
+    WHERE date = OLD.date AND court_id = OLD.court_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_delete AFTER DELETE ON reservations
+WHEN OLD.status = 'confirmed'
+BEGIN
+    UPDATE court_daily_stats SET reservations = reservations - 1, revenue = revenue - OLD.price
+    WHERE date = OLD.date AND court_id = OLD.court_id;
+END;
+"""
+
+
+class SQLiteStorage:
+    """Almacenamiento de usuarios, canchas y reservaciones en SQLite (modo WAL)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self.reservations = SQLiteReservationStore(self)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Se abre al primer uso y no al construir: main.py crea el almacén al
+        # importarse y los procesos de hashing (spawn) lo vuelven a importar
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    self._connection = conn
+        return self._connection
+
+    def initialize(self):
+        """Crea las tablas, índices y triggers si no existen"""
+        with self._lock:
+            stats_exist = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'court_daily_stats'"
+            ).fetchone()
+            self._conn.executescript(SCHEMA)
+            if not stats_exist:
+                # Base creada antes de los totales: se calculan una vez desde las reservaciones
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO court_daily_stats (date, court_id, reservations, revenue) "
+                        "SELECT date, court_id, COUNT(*), SUM(price) FROM reservations "
+                        "WHERE status = 'confirmed' GROUP BY date, court_id"
+                    )
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock, time_storage('query', self.path):
+            return self._conn.execute(sql, params)
+
+    def fetchall(self, sql: str, params=()) -> List[dict]:
+        with self._lock, time_storage('query', self.path):
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def fetchone(self, sql: str, params=()) -> Optional[dict]:
+        with self._lock, time_storage('query', self.path):
+            row = self._conn.execute(sql, params).fetchone()
+            return dict(row) if row else None
+
+    def iter_rows(self, table: str, columns: str, conditions: List[str], params: list,
+                  after_rowid: int = 0, page_size: int = 500) -> Iterator[dict]:
+        """Recorre una tabla por rowid en bloques de `page_size`, sin cargarla completa"""
+        where = ' AND '.join(['rowid > ?'] + conditions)
+        while True:
+            rows = self.fetchall(
+                f"SELECT rowid AS _rowid, {columns} FROM {table} WHERE {where} ORDER BY rowid LIMIT ?",
+                (after_rowid, *params, page_size)
+            )
+            for row in rows:
+                after_rowid = row.pop('_rowid')
+                yield row
+            if len(rows) < page_size:
+                return
+
+    def rowid_of(self, table: str, row_id: str) -> int:
+        """rowid de la fila con ese id; KeyError si no existe"""
+        row = self.fetchone(f"SELECT rowid AS _rowid FROM {table} WHERE id = ?", (row_id,))
+        if row is None:
+            raise KeyError(row_id)
+        return row['_rowid']
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # Usuarios
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        return self.fetchone("SELECT * FROM users WHERE email = ? COLLATE NOCASE", (email,))
+
+    def save_user(self, user_data: dict):
+        """Inserta el usuario; lanza DuplicateEmailError si otro registro ganó el correo"""
+        try:
+            with self._lock, time_storage('write', self.path), self._conn:
+                self._conn.execute(
+                    "INSERT INTO users (id, name, email, password, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (user_data['id'], user_data['name'], user_data['email'],
+                     user_data['password'], user_data['created_at'])
+                )
+        except sqlite3.IntegrityError:
+            if self.get_user_by_email(user_data['email']):
+                raise DuplicateEmailError(user_data['email'])
+            raise
+
+    def update_user_password(self, user_id: str, password: str):
+        with self._lock, time_storage('write', self.path), self._conn:
+            self._conn.execute("UPDATE users SET password = ? WHERE id = ?", (password, user_id))
+
+    def all_users(self) -> List[dict]:
+        return self.fetchall("SELECT id, name, email, created_at FROM users ORDER BY rowid")
+
+    def query_users(self, after: Optional[str] = None) -> Iterator[dict]:
+        start = self.rowid_of('users', after) if after is not None else 0
+        return self.iter_rows('users', 'id, name, email, created_at', [], [], start)
+
+    # Migración desde CSV (courts.csv también se sincroniza al iniciar)
+    def import_users_csv(self, path: str) -> int:
+        """Importa users.csv; omite (y avisa cuántos) los correos o ids que ya existan"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r', encoding='utf-8') as file:
+            rows = [(r['id'], r['name'], r['email'], r['password'], r['created_at'])
+                    for r in csv.DictReader(file)]
+        with self._lock, time_storage('write', self.path), self._conn:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO users (id, name, email, password, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        if cursor.rowcount < len(rows):
+            print(f"⚠️  {len(rows) - cursor.rowcount} usuarios de {path} omitidos: su correo o id ya existía")
+        return cursor.rowcount
+
+    def import_courts_csv(self, path: str) -> int:
+        """Importa courts.csv reemplazando canchas con el mismo id"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r', encoding='utf-8') as file:
+            rows = [tuple(int(r[f]) if f == 'price_per_hour' else r[f] for f in COURT_FIELDS)
+                    for r in csv.DictReader(file)]
+        with self._lock, time_storage('write', self.path), self._conn:
+            cursor = self._conn.executemany(
+                f"INSERT OR REPLACE INTO courts ({', '.join(COURT_FIELDS)}) VALUES ({', '.join('?' * len(COURT_FIELDS))})",
+                rows
+            )
+        return cursor.rowcount
+
+    def import_reservations_csv(self, path: str, events_path: str,
+                                archive: Optional[ReservationArchive] = None) -> int:
+        """Importa los segmentos archivados y reservations.csv con el log de cambios de estado
+
+        Solo lee los archivos (no crea el log ni candados junto al CSV). Omite
+        (y avisa cuántas) las reservaciones cuyo id ya existe o que chocan
+        con un horario confirmado.
+        """
+        months = archive.months() if archive else []
+        rows = [row for month in months for row in archive.rows(month)]
+        # Las filas de un mes ya archivado que sigan en el CSV (archivación interrumpida) ya se importaron
+        archived_through = max(months, default='')
+        status_of = {}
+        if os.path.exists(events_path):
+            with open(events_path, 'r', encoding='utf-8', newline='') as file:
+                for event in csv.DictReader(file):
+                    status_of[event['reservation_id']] = event['status']
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                for row in csv.DictReader(file):
+                    if archived_through and partition_of(row['date']) <= archived_through:
+                        continue
+                    row['status'] = status_of.get(row['id'], row['status'])
+                    rows.append(row)
+        rows = [tuple(r[f] for f in RESERVATION_FIELDS) for r in rows]
+        with self._lock, time_storage('write', self.path), self._conn:
+            cursor = self._conn.executemany(
+                f"INSERT OR IGNORE INTO reservations ({', '.join(RESERVATION_FIELDS)}) VALUES ({', '.join('?' * len(RESERVATION_FIELDS))})",
+                rows
+            )
+        if cursor.rowcount < len(rows):
+            print(f"⚠️  {len(rows) - cursor.rowcount} reservaciones de {path} omitidas: su id ya existía o el horario ya estaba ocupado")
+        return cursor.rowcount
+
+
+class SQLiteReservationStore:
+    """Misma interfaz que ReservationStore pero respaldada por SQLite"""
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+
+    def load(self):
+        """Nada que cargar: SQLite consulta sus índices directamente"""
+
+    def compact(self):
+        """Hace checkpoint del WAL"""
+        self.storage.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def add(self, reservation_data: dict):
+        try:
+            with self.storage._lock, time_storage('write', self.storage.path), self.storage._conn:
+                self.storage._conn.execute(
+                    f"INSERT INTO reservations ({', '.join(RESERVATION_FIELDS)}) VALUES ({', '.join('?' * len(RESERVATION_FIELDS))})",
+                    tuple(reservation_data[f] for f in RESERVATION_FIELDS)
+                )
+        except sqlite3.IntegrityError:
+            raise SlotConflictError(reservation_data['court_id'], reservation_data['date'],
+                                    reservation_data['time'])
+
+    def add_many(self, reservations: List[dict]):
+        """Inserta todas las reservaciones en una transacción; si alguna choca no se guarda ninguna"""
+        with self.storage._lock:
+            conflicts = find_conflicts(reservations, self.has_conflict)
+            if conflicts:
+                raise BatchConflictError(conflicts)
+            try:
+                with time_storage('write', self.storage.path), self.storage._conn:
+                    self.storage._conn.executemany(
+                        f"INSERT INTO reservations ({', '.join(RESERVATION_FIELDS)}) VALUES ({', '.join('?' * len(RESERVATION_FIELDS))})",
+                        [tuple(r[f] for f in RESERVATION_FIELDS) for r in reservations]
+                    )
+            except sqlite3.IntegrityError:
+                raise BatchConflictError(find_conflicts(reservations, self.has_conflict))
+
+    def get(self, reservation_id: str) -> Optional[dict]:
+        return self.storage.fetchone("SELECT * FROM reservations WHERE id = ?", (reservation_id,))
+
+    def by_court_and_date(self, court_id: str, date_str: str) -> List[dict]:
+        return self.storage.fetchall(
+            "SELECT * FROM reservations WHERE court_id = ? AND date = ? AND status = 'confirmed' ORDER BY rowid",
+            (court_id, date_str)
+        )
+
+    def by_date(self, date_str: str) -> List[dict]:
+        return self.storage.fetchall(
+            "SELECT * FROM reservations WHERE date = ? AND status = 'confirmed' ORDER BY time, court_id",
+            (date_str,)
+        )
+
+    def by_user(self, user_id: str, include_archived: bool = False) -> List[dict]:
+        # En SQLite no se archiva: la tabla tiene todo el historial
+        return self.storage.fetchall(
+            "SELECT * FROM reservations WHERE user_id = ? ORDER BY rowid", (user_id,)
+        )
+
+    def all(self) -> List[dict]:
+        return self.storage.fetchall("SELECT * FROM reservations ORDER BY rowid")
+
+    def query(self, after: Optional[str] = None, court_id: Optional[str] = None,
+              status: Optional[str] = None, date_from: Optional[str] = None,
+              date_to: Optional[str] = None) -> Iterator[dict]:
+        start = self.storage.rowid_of('reservations', after) if after is not None else 0
+        conditions, params = [], []
+        for column, op, value in [('court_id', '=', court_id), ('status', '=', status),
+                                  ('date', '>=', date_from), ('date', '<=', date_to)]:
+            if value:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        return self.storage.iter_rows('reservations', '*', conditions, params, start)
+
+    def daily_totals(self, date_from: str, date_to: str) -> List[dict]:
+        return self.storage.fetchall(
+            "SELECT date, court_id, reservations, revenue FROM court_daily_stats "
+            "WHERE date BETWEEN ? AND ? AND reservations > 0 ORDER BY date, court_id",
+            (date_from, date_to)
+        )
+
+    def has_conflict(self, court_id: str, date_str: str, time: str) -> bool:
+        return self.storage.fetchone(
+            "SELECT 1 FROM reservations WHERE court_id = ? AND date = ? AND time = ? AND status = 'confirmed'",
+            (court_id, date_str, time)
+        ) is not None
+
+    def occupancy(self, court_id: str, date_str: str) -> int:
+        mask = 0
+        for row in self.storage.fetchall(
+            "SELECT time FROM reservations WHERE court_id = ? AND date = ? AND status = 'confirmed'",
+            (court_id, date_str)
+        ):
+            mask |= slot_bit(row['time'])
+        return mask
+
+    def set_status(self, reservation_id: str, new_status: str) -> bool:
+        try:
+            with self.storage._lock, time_storage('write', self.storage.path), self.storage._conn:
+                cursor = self.storage._conn.execute(
+                    "UPDATE reservations SET status = ? WHERE id = ?", (new_status, reservation_id)
+                )
+        except sqlite3.IntegrityError:
+            row = self.get(reservation_id)
+            raise SlotConflictError(row['court_id'], row['date'], row['time'])
+        return cursor.rowcount > 0
+
+    def cancel(self, reservation_id: str) -> bool:
+        return self.set_status(reservation_id, 'cancelled')
+
+
+def migrate(database: str, users_file: str, courts_file: str,
+            reservations_file: str, events_file: str, archive_dir: str):
+    """Importa los CSV existentes a la base de datos SQLite"""
+    storage = SQLiteStorage(database)
+    storage.initialize()
+    started = datetime.now()
+    users = storage.import_users_csv(users_file)
+    courts = storage.import_courts_csv(courts_file)
+    reservations = storage.import_reservations_csv(reservations_file, events_file,
+                                                   ReservationArchive(archive_dir))
+    storage.close()
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"✅ Migración completa en {elapsed:.2f}s → {database}")
+    print(f"   Usuarios: {users} | Canchas: {courts} | Reservaciones: {reservations}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra los CSV de la API de reservas a SQLite")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--db", default="reservas.db")
+    parser.add_argument("--users", default="users.csv")
+    parser.add_argument("--courts", default="courts.csv")
+    parser.add_argument("--reservations", default="reservations.csv")
+    parser.add_argument("--events", default="reservation_events.csv")
+    parser.add_argument("--archive", default="reservations_archive")
+    args = parser.parse_args()
+    migrate(args.db, args.users, args.courts, args.reservations, args.events, args.archive)
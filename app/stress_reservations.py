@@ -0,0 +1,122 @@
+"""Prueba de estrés de reservaciones concurrentes.
+
+Lanza miles de POST /reservations (y lotes de un horario) en paralelo sobre
+unos pocos horarios y verifica que cada horario quede con una sola
+reservación confirmada, tanto en memoria como al recargar los archivos.
+Cada solicitud escribe la hora y la fecha de una de varias formas ('8:00',
+'08:00', '008:00'; '2030-01-05' o '2030-1-5'), que deben contar como el
+mismo horario. Corre sobre un directorio temporal, así que no toca los CSV
+reales. Requiere httpx (lo usa TestClient).
+
+Uso: python stress_reservations.py [--requests 5000] [--slots 40] [--workers 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def count_duplicates(reservations) -> int:
+    confirmed = Counter(
+        (r['court_id'], r['date'], r['time'])
+        for r in reservations if r['status'] == 'confirmed'
+    )
+    return sum(total - 1 for total in confirmed.values() if total > 1)
+
+
+def check_variants(client) -> list:
+    """Errores al reservar el mismo horario escrito de formas distintas"""
+    errors = []
+    day = date(date.today().year + 1, 1, 5)
+    codes = [client.post("/reservations", json={"user_id": "variantes", "court_id": "t1", "date": day.isoformat(),
+                                                "time": hour}).status_code
+             for hour in ("08:00", "8:00", "008:00")]
+    if codes != [201, 409, 409]:
+        errors.append(f"08:00 / 8:00 / 008:00 -> {codes}")
+    codes = [client.post("/reservations", json={"user_id": "variantes", "court_id": "t2", "date": text,
+                                                "time": "10:00"}).status_code
+             for text in (day.isoformat(), f"{day.year}-{day.month}-{day.day}")]
+    if codes != [201, 409]:
+        errors.append(f"{day.isoformat()} / {day.year}-{day.month}-{day.day} -> {codes}")
+    code = client.post("/reservations/batch", json={"user_id": "variantes", "court_id": "t4", "slots": [
+        {"date": day.isoformat(), "time": "09:00"}, {"date": day.isoformat(), "time": "9:00"}
+    ]}).status_code
+    if code != 409:
+        errors.append(f"lote con 09:00 y 9:00 -> {code}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de estrés de POST /reservations")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--slots", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=64)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="stress_reservas_"))
+
+    from fastapi.testclient import TestClient
+    import main as api
+
+    # Un día menor a 10 para que la fecha también se pueda escribir sin ceros
+    booking_date = date.today() + timedelta(days=7)
+    while booking_date.day >= 10:
+        booking_date += timedelta(days=1)
+    date_texts = [booking_date.isoformat(), f"{booking_date.year}-{booking_date.month}-{booking_date.day}"]
+    # Canchas abiertas todos los días de 6:00 a 22:00, para que ningún horario quede fuera
+    open_courts = ["t1", "t2", "t4", "r1"]
+    slots = [(open_courts[i % 4], 6 + (i // 4) % 16) for i in range(args.slots)]
+    slots = list(dict.fromkeys(slots))
+
+    def book(client, n):
+        court_id, hour = slots[n % len(slots)]
+        date_text = date_texts[n // len(slots) % 2]
+        time_text = [f"{hour}:00", f"{hour:02d}:00", f"{hour:03d}:00"][n // len(slots) % 3]
+        if n % 5 == 0:
+            return client.post("/reservations/batch", json={
+                "user_id": f"stress-{n}",
+                "court_id": court_id,
+                "slots": [{"date": date_text, "time": time_text}]
+            }).status_code
+        return client.post("/reservations", json={
+            "user_id": f"stress-{n}",
+            "court_id": court_id,
+            "court_name": f"Cancha {court_id}",
+            "date": date_text,
+            "time": time_text,
+            "price": 350
+        }).status_code
+
+    with TestClient(api.app) as client:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            codes = Counter(pool.map(lambda n: book(client, n), range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+        in_memory = count_duplicates(api.reservation_store.all())
+        variant_errors = check_variants(client)
+
+    api.reservation_store.load()
+    on_disk = count_duplicates(api.reservation_store.all())
+
+    print(f"📨 {args.requests} solicitudes en {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"   201: {codes[201]} | 409: {codes[409]} | otros: {sum(codes.values()) - codes[201] - codes[409]}")
+    print(f"   Horarios distintos: {len(slots)} | duplicados en memoria: {in_memory} | en disco: {on_disk}")
+
+    for error in variant_errors:
+        print(f"   Mismo horario escrito distinto: {error}")
+
+    if codes[201] != len(slots) or in_memory or on_disk or variant_errors:
+        print("❌ Se detectaron reservaciones duplicadas o perdidas")
+        sys.exit(1)
+    print("✅ Sin duplicados")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import csv
 import os
+import sys
 from datetime import datetime
 from typing import Optional
 import uuid
 
+# Módulos compartidos entre las apps (carpeta shared/ en la raíz del repo)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.listing import NEXT_CURSOR_HEADER, listing_response
+from shared.user_directory import UserDirectory
+
+from product_store import ProductStore
+
 app = FastAPI()
 
 # Configurar CORS
@@ -16,11 +24,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Archivos CSV
 USERS_FILE = "users.csv"
 PRODUCTS_FILE = "products.csv"
+PRODUCT_CHANGES_FILE = "product_changes.csv"
 
 # Crear archivos CSV si no existen
 def init_csv():
@@ -36,6 +46,13 @@ def init_csv():
 
 init_csv()
 
+# Usuarios indexados por correo en memoria
+user_directory = UserDirectory(USERS_FILE, ['email', 'password'])
+
+# Productos indexados en memoria; ediciones y bajas van a un log de cambios
+product_store = ProductStore(PRODUCTS_FILE, PRODUCT_CHANGES_FILE)
+product_store.load()
+
 # Modelos Pydantic
 class RegisterRequest(BaseModel):
     email: str
@@ -63,31 +80,23 @@ class ProductUpdate(BaseModel):
 # Funciones de Usuarios
 def email_exists(email: str) -> bool:
     try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['email'] == email:
-                    return True
+        return user_directory.exists(email)
     except:
         pass
     return False
 
 def save_user(email: str, password: str):
     try:
-        with open(USERS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([email, password])
+        user_directory.add({'email': email, 'password': password})
         return True
     except:
         return False
 
 def verify_user(email: str, password: str) -> bool:
     try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['email'] == email and row['password'] == password:
-                    return True
+        user = user_directory.get(email)
+        if user and user['password'] == password:
+            return True
     except:
         pass
     return False
@@ -96,82 +105,43 @@ def verify_user(email: str, password: str) -> bool:
 def save_product(name: str, description: str, price: float, category: str, stock: int, email: str):
     try:
         product_id = str(uuid.uuid4())[:8]
-        with open(PRODUCTS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([product_id, name, description, price, category, stock, email, datetime.now().isoformat()])
+        product_store.add({
+            'id': product_id,
+            'name': name,
+            'description': description,
+            'price': price,
+            'category': category,
+            'stock': stock,
+            'email': email,
+            'created_at': datetime.now().isoformat()
+        })
         return product_id
     except:
         return None
 
-def get_user_products(email: str):
-    products = []
-    try:
-        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['email'] == email:
-                    products.append(row)
-    except:
-        pass
-    return products
-
 def get_product_by_id(product_id: str, email: str):
-    try:
-        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['id'] == product_id and row['email'] == email:
-                    return row
-    except:
-        pass
-    return None
+    return product_store.get(product_id, email)
 
 def update_product(product_id: str, email: str, data: ProductUpdate):
     try:
-        rows = []
-        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['id'] == product_id and row['email'] == email:
-                    if data.name:
-                        row['name'] = data.name
-                    if data.description:
-                        row['description'] = data.description
-                    if data.price is not None:
-                        row['price'] = data.price
-                    if data.category:
-                        row['category'] = data.category
-                    if data.stock is not None:
-                        row['stock'] = data.stock
-                rows.append(row)
-        
-        with open(PRODUCTS_FILE, 'w', newline='', encoding='utf-8') as f:
-            if rows:
-                writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                writer.writeheader()
-                writer.writerows(rows)
-        return True
+        changes = {}
+        if data.name:
+            changes['name'] = data.name
+        if data.description:
+            changes['description'] = data.description
+        if data.price is not None:
+            changes['price'] = data.price
+        if data.category:
+            changes['category'] = data.category
+        if data.stock is not None:
+            changes['stock'] = data.stock
+        return product_store.update(product_id, email, changes)
     except:
         return False
 
 def delete_product(product_id: str, email: str):
     try:
-        rows = []
-        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if not (row['id'] == product_id and row['email'] == email):
-                    rows.append(row)
-        
-        with open(PRODUCTS_FILE, 'w', newline='', encoding='utf-8') as f:
-            if rows:
-                writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                writer.writeheader()
-                writer.writerows(rows)
-            else:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'name', 'description', 'price', 'category', 'stock', 'email', 'created_at'])
-        return True
+        return product_store.delete(product_id, email)
     except:
         return False
 
@@ -229,12 +199,23 @@ def create_product(product: ProductRequest, email: str):
         raise HTTPException(status_code=500, detail="Error al crear el producto")
 
 @app.get("/api/products")
-def get_products(email: str):
+def get_products(
+    email: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")
+):
     if not email:
         raise HTTPException(status_code=401, detail="No autorizado")
     
-    products = get_user_products(email)
-    return {"products": products}
+    try:
+        products = product_store.query(email, after, category, min_price, max_price)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return listing_response(products, limit, fmt, envelope="products")
 
 @app.get("/api/products/{product_id}")
 def get_product(product_id: str, email: str):
@@ -3,8 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 import csv
 import os
+import sys
 from datetime import datetime
-import hashlib
+
+# Módulos compartidos entre las apps (carpeta shared/ en la raíz del repo)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.password_hasher import PasswordHasher
+from shared.user_directory import UserDirectory
+
+from user_stats import UserStats
 
 app = FastAPI(title="Auth API", version="1.0.0")
 
@@ -19,6 +26,8 @@ app.add_middleware(
 
 # Archivo CSV
 USERS_FILE = "users.csv"
+# Total de usuarios y último registro, para /api/stats
+USERS_STATS_FILE = "users_stats.json"
 
 # Inicializar CSV
 def init_csv():
@@ -27,7 +36,19 @@ def init_csv():
             writer = csv.writer(f)
             writer.writerow(['email', 'password', 'created_at'])
 
-init_csv()
+# Usuarios indexados por correo en memoria
+user_directory = UserDirectory(USERS_FILE, ['email', 'password', 'created_at'])
+
+user_stats = UserStats(USERS_FILE, USERS_STATS_FILE)
+
+# Hash con scrypt en un pool de procesos (PASSWORD_HASH_WORKERS, por defecto uno por núcleo)
+password_hasher = PasswordHasher()
+
+# Al arrancar, y no al importar: los procesos de hashing (spawn) vuelven a
+# importar este archivo
+@app.on_event("startup")
+def startup_event():
+    init_csv()
 
 # Modelos
 class RegisterRequest(BaseModel):
@@ -41,17 +62,13 @@ class LoginRequest(BaseModel):
 
 # Funciones de utilidad
 def hash_password(password: str) -> str:
-    """Hash simple de contraseña (en producción usar bcrypt)"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash con sal (scrypt), calculado en el pool de procesos"""
+    return password_hasher.hash_blocking(password)
 
 def email_exists(email: str) -> bool:
     """Verifica si el email ya está registrado"""
     try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['email'].lower() == email.lower():
-                    return True
+        return user_directory.exists(email)
     except:
         pass
     return False
@@ -60,9 +77,12 @@ def save_user(email: str, password: str) -> bool:
     """Guarda un nuevo usuario en CSV"""
     try:
         hashed = hash_password(password)
-        with open(USERS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([email, hashed, datetime.now().isoformat()])
+        user_directory.add({
+            'email': email,
+            'password': hashed,
+            'created_at': datetime.now().isoformat()
+        })
+        user_stats.refresh()
         return True
     except Exception as e:
         print(f"Error guardando usuario: {e}")
@@ -71,12 +91,17 @@ def save_user(email: str, password: str) -> bool:
 def verify_credentials(email: str, password: str) -> bool:
     """Verifica las credenciales del usuario"""
     try:
-        hashed = hash_password(password)
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['email'].lower() == email.lower() and row['password'] == hashed:
-                    return True
+        user = user_directory.get(email)
+        if not user:
+            return False
+        valid, upgraded_hash = password_hasher.check_blocking(password, user['password'])
+        # Los hashes SHA-256 anteriores se reemplazan por scrypt al iniciar sesión
+        if valid and upgraded_hash:
+            try:
+                user_directory.update(email, {'password': upgraded_hash})
+            except Exception as e:
+                print(f"Error actualizando hash: {e}")
+        return valid
     except:
         pass
     return False
@@ -148,13 +173,7 @@ def login(data: LoginRequest):
 def get_stats():
     """Estadísticas del sistema"""
     try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            users = list(reader)
-            return {
-                "total_users": len(users),
-                "last_registration": users[-1]['created_at'] if users else None
-            }
+        return user_stats.get()
     except:
         return {"total_users": 0, "last_registration": None}
 
@@ -0,0 +1,200 @@
+import csv
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from shared.group_commit import GroupCommitWriter
+
+PRODUCT_FIELDS = ['id', 'name', 'description', 'price', 'category', 'stock', 'email', 'created_at']
+CHANGE_FIELDS = ['op', 'id', 'email', 'name', 'description', 'price', 'category', 'stock', 'changed_at']
+EDITABLE_FIELDS = ['name', 'description', 'price', 'category', 'stock']
+
+# Cambios acumulados antes de consolidarlos en products.csv
+DEFAULT_COMPACT_THRESHOLD = 500
+
+
+class ProductStore:
+    """Productos en memoria indexados por (email, id) y por email.
+
+    products.csv se lee una vez al iniciar. Las altas se agregan al CSV; las
+    ediciones y bajas se agregan a un log de cambios en lugar de reescribir
+    el archivo, y el log se consolida en products.csv al llegar a
+    `compact_threshold` cambios.
+
+    Los productos de cada email van en una lista en orden de creación y
+    cada (email, id) guarda su posición, así que continuar una página desde
+    `after` no busca el id en la lista. Una baja deja un hueco (None) que
+    desaparece al compactar.
+    """
+
+    def __init__(self, path: str, changes_path: str,
+                 compact_threshold: int = DEFAULT_COMPACT_THRESHOLD):
+        self.path = path
+        self.changes_path = changes_path
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._writer = GroupCommitWriter(path)
+        self._pending_changes = 0
+        self._by_key: Dict[Tuple[str, str], dict] = {}
+        # email -> productos en orden de creación (None donde hubo una baja)
+        self._by_email: Dict[str, List[Optional[dict]]] = {}
+        # (email, id) -> posición en la lista de su email
+        self._position: Dict[Tuple[str, str], int] = {}
+
+    def load(self):
+        """Lee products.csv, aplica el log de cambios y reconstruye los índices"""
+        with self._lock:
+            self._by_key.clear()
+            self._by_email.clear()
+            self._position.clear()
+            self._pending_changes = 0
+
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        # Una compactación concurrente con un alta en lote puede duplicar la fila
+                        if (row['email'], row['id']) not in self._by_key:
+                            self._index(row)
+
+            if os.path.exists(self.changes_path):
+                with open(self.changes_path, 'r', encoding='utf-8') as f:
+                    for change in csv.DictReader(f):
+                        self._apply(change)
+                        self._pending_changes += 1
+            else:
+                self._reset_changes()
+
+    def _index(self, row: dict):
+        key = (row['email'], row['id'])
+        products = self._by_email.setdefault(row['email'], [])
+        self._by_key[key] = row
+        self._position[key] = len(products)
+        products.append(row)
+
+    def _unindex(self, email: str, product_id: str):
+        del self._by_key[(email, product_id)]
+        self._by_email[email][self._position.pop((email, product_id))] = None
+
+    def _drop_gaps(self):
+        """Reconstruye las listas por email sin los huecos de las bajas"""
+        self._by_email.clear()
+        self._position.clear()
+        for row in self._by_key.values():
+            self._index(row)
+
+    def _apply(self, change: dict) -> bool:
+        """Aplica un cambio del log en memoria"""
+        row = self._by_key.get((change['email'], change['id']))
+        if row is None:
+            return False
+        if change['op'] == 'delete':
+            self._unindex(change['email'], change['id'])
+        else:
+            for field in EDITABLE_FIELDS:
+                row[field] = change[field]
+        return True
+
+    def add(self, product: dict):
+        """Agrega un producto nuevo al índice y a products.csv"""
+        row = {field: str(product[field]) for field in PRODUCT_FIELDS}
+        with self._lock:
+            self._index(row)
+        try:
+            self._writer.write_row([row[field] for field in PRODUCT_FIELDS])
+        except Exception:
+            with self._lock:
+                self._unindex(row['email'], row['id'])
+            raise
+
+    def get(self, product_id: str, email: str) -> Optional[dict]:
+        row = self._by_key.get((email, product_id))
+        return dict(row) if row else None
+
+    def by_email(self, email: str) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self._by_email.get(email, []) if row is not None]
+
+    def query(self, email: str, after: Optional[str] = None, category: Optional[str] = None,
+              min_price: Optional[float] = None, max_price: Optional[float] = None) -> Iterator[dict]:
+        """Productos del usuario en orden de creación, con filtros
+
+        `after` es el id del último producto ya entregado; lanza KeyError si
+        no pertenece al usuario.
+        """
+        with self._lock:
+            start = 0
+            if after is not None:
+                position = self._position.get((email, after))
+                if position is None:
+                    raise KeyError(after)
+                start = position + 1
+            products = [row for row in self._by_email.get(email, [])[start:] if row is not None]
+        return self._scan(products, category, min_price, max_price)
+
+    @staticmethod
+    def _scan(products: List[dict], category: Optional[str],
+              min_price: Optional[float], max_price: Optional[float]) -> Iterator[dict]:
+        for row in products:
+            if category and row['category'] != category:
+                continue
+            if min_price is not None and float(row['price']) < min_price:
+                continue
+            if max_price is not None and float(row['price']) > max_price:
+                continue
+            yield dict(row)
+
+    def update(self, product_id: str, email: str, changes: dict) -> bool:
+        """Modifica campos de un producto; regresa False si no existe"""
+        with self._lock:
+            row = self._by_key.get((email, product_id))
+            if row is None:
+                return False
+            updated = dict(row)
+            for field, value in changes.items():
+                updated[field] = str(value)
+            return self._record('update', updated)
+
+    def delete(self, product_id: str, email: str) -> bool:
+        """Da de baja un producto; regresa False si no existe"""
+        with self._lock:
+            row = self._by_key.get((email, product_id))
+            if row is None:
+                return False
+            return self._record('delete', row)
+
+    def _record(self, op: str, row: dict) -> bool:
+        change = {field: row.get(field, '') for field in CHANGE_FIELDS}
+        change['op'] = op
+        change['changed_at'] = datetime.now().isoformat()
+        with open(self.changes_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([change[field] for field in CHANGE_FIELDS])
+        self._apply(change)
+        self._pending_changes += 1
+
+        if self._pending_changes >= self.compact_threshold:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Consolida el log de cambios en products.csv y lo vacía
+
+        Toma el candado del escritor en lote: un alta no se agrega al
+        archivo viejo mientras se reemplaza.
+        """
+        with self._lock, self._writer.exclusive():
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=PRODUCT_FIELDS)
+                writer.writeheader()
+                writer.writerows(self._by_key.values())
+            os.replace(tmp_path, self.path)
+            self._reset_changes()
+            self._drop_gaps()
+
+    def _reset_changes(self):
+        with open(self.changes_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CHANGE_FIELDS)
+        self._pending_changes = 0
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import os
+import threading
+from typing import Optional
+
+# Bytes que se leen por bloque al contar filas
+CHUNK_SIZE = 1 << 20
+
+
+class UserStats:
+    """Total de usuarios y último registro, guardados en un archivo aparte.
+
+    El archivo lateral (JSON) guarda el total, la fecha del último registro y
+    hasta qué byte de users.csv ya está contado. Consultar cuesta un `stat`:
+    si users.csv creció solo se leen los bytes nuevos (la cola del archivo) y
+    si se reemplazó (otro inode), se acortó o falta el archivo lateral se
+    recuenta por bloques, sin cargar las filas en memoria.
+    """
+
+    def __init__(self, users_path: str, stats_path: str, date_field: str = 'created_at'):
+        self.users_path = users_path
+        self.stats_path = stats_path
+        self.date_field = date_field
+        self._lock = threading.Lock()
+        self._total = 0
+        self._last: Optional[str] = None
+        self._offset = 0
+        self._inode = 0
+        self._date_index: Optional[int] = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._total = data['total_users']
+            self._last = data['last_registration']
+            self._offset = data['counted_bytes']
+            self._inode = data['inode']
+        except (OSError, ValueError, KeyError):
+            self._total, self._last, self._offset, self._inode = 0, None, 0, 0
+
+    def _save(self):
+        tmp_path = self.stats_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'total_users': self._total,
+                'last_registration': self._last,
+                'counted_bytes': self._offset,
+                'inode': self._inode
+            }, f)
+        os.replace(tmp_path, self.stats_path)
+
+    def get(self) -> dict:
+        """Total y último registro al día con users.csv"""
+        self.refresh()
+        return {"total_users": self._total, "last_registration": self._last}
+
+    def refresh(self):
+        """Cuenta las filas agregadas desde la última vez y actualiza el archivo lateral"""
+        try:
+            stat = os.stat(self.users_path)
+        except OSError:
+            return
+        if stat.st_size == self._offset and stat.st_ino == self._inode:
+            return
+
+        with self._lock:
+            if stat.st_ino != self._inode or stat.st_size < self._offset or self._offset == 0:
+                # Archivo reescrito o sin conteo previo: se recuenta desde el encabezado
+                self._total, self._last, self._offset = 0, None, 0
+                self._inode = stat.st_ino
+            self._count_from(self._offset)
+            self._save()
+
+    def _count_from(self, offset: int):
+        with open(self.users_path, 'rb') as f:
+            if offset == 0:
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    return
+                fields = next(csv.reader([header.decode('utf-8')]), [])
+                self._date_index = fields.index(self.date_field) if self.date_field in fields else None
+                offset = len(header)
+            f.seek(offset)
+
+            last_line = b''
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                end = chunk.rfind(b'\n') + 1
+                if end == 0:
+                    # Sin salto de línea: fila a medio escribir, se cuenta en la siguiente pasada
+                    break
+                self._total += chunk.count(b'\n', 0, end)
+                lines = chunk[:end].rstrip(b'\n').rsplit(b'\n', 1)
+                last_line = lines[-1]
+                offset += end
+                f.seek(offset)
+
+        self._offset = offset
+        if last_line:
+            self._last = self._parse_date(last_line) or self._last
+
+    def _parse_date(self, line: bytes) -> Optional[str]:
+        if self._date_index is None:
+            with open(self.users_path, 'r', encoding='utf-8') as f:
+                fields = next(csv.reader([f.readline()]), [])
+            self._date_index = fields.index(self.date_field) if self.date_field in fields else None
+            if self._date_index is None:
+                return None
+        row = next(csv.reader(io.StringIO(line.decode('utf-8'))), [])
+        return row[self._date_index] if len(row) > self._date_index else None
@@ -3,9 +3,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 import csv
 import os
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 import secrets
-import hashlib
+
+# Módulos compartidos entre las apps (carpeta shared/ en la raíz del repo)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared.metrics import MetricsMiddleware, metrics
+from shared.password_hasher import PasswordHasher
+from shared.structured_logging import REQUEST_ID_HEADER, RequestIdMiddleware, get_logger
+from shared.user_directory import UserDirectory
+
+from session_store import SessionStore
 
 app = FastAPI(title="Sistema de Autenticación")
 
@@ -16,12 +25,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
 
+# Latencia y conteo por ruta, expuestos en /metrics
+app.add_middleware(MetricsMiddleware)
+# Id de correlación por solicitud (cabecera X-Request-ID) para los logs
+app.add_middleware(RequestIdMiddleware)
+
+# Logs JSON escritos desde un hilo de fondo (LOG_LEVEL, LOG_SAMPLING)
+logger = get_logger("registro")
+
 # Archivos CSV
 USERS_FILE = "users.csv"
 SESSIONS_FILE = "sessions.csv"
 
+# Vigencia de las sesiones y cada cuánto se purgan las vencidas del CSV
+SESSION_TTL_HOURS = int(os.getenv("SESSION_TTL_HOURS", "24"))
+SESSION_PURGE_SECONDS = int(os.getenv("SESSION_PURGE_SECONDS", "3600"))
+
 # Modelos
 class UserRegister(BaseModel):
     nombre: str
@@ -45,24 +67,42 @@ def init_csv_files():
         with open(USERS_FILE, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['id', 'nombre', 'email', 'password_hash', 'fecha_registro'])
-        print(f"✅ {USERS_FILE} creado")
+        logger.info("Archivo creado", extra={"file": USERS_FILE})
     
     if not os.path.exists(SESSIONS_FILE):
         with open(SESSIONS_FILE, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['token', 'user_id', 'fecha_creacion'])
-        print(f"✅ {SESSIONS_FILE} creado")
+        logger.info("Archivo creado", extra={"file": SESSIONS_FILE})
 
-init_csv_files()
+# Usuarios indexados por correo (y por id para verificar sesiones)
+user_directory = UserDirectory(USERS_FILE, ['id', 'nombre', 'email', 'password_hash', 'fecha_registro'])
 
-# Funciones auxiliares (SIN bcrypt, más simple)
+session_store = SessionStore(
+    SESSIONS_FILE,
+    user_directory,
+    ttl=timedelta(hours=SESSION_TTL_HOURS),
+    purge_interval=SESSION_PURGE_SECONDS
+)
+
+# Hash con scrypt en un pool de procesos (PASSWORD_HASH_WORKERS, por defecto uno por núcleo)
+password_hasher = PasswordHasher()
+
+# Funciones auxiliares
 def hash_password(password: str) -> str:
-    """Hash simple con SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash con sal (scrypt), calculado en el pool de procesos"""
+    return password_hasher.hash_blocking(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verificar contraseña"""
-    return hash_password(plain_password) == hashed_password
+def verify_password(user: dict, plain_password: str) -> bool:
+    """Verificar contraseña; si el hash es SHA-256 se actualiza a scrypt"""
+    valid, upgraded_hash = password_hasher.check_blocking(plain_password, user['password_hash'])
+    if valid and upgraded_hash:
+        try:
+            user_directory.update(user['email'], {'password_hash': upgraded_hash})
+            logger.info("Hash actualizado a scrypt", extra={"email": user['email']})
+        except Exception:
+            logger.exception("Error al actualizar hash", extra={"email": user['email']})
+    return valid
 
 def generate_token() -> str:
     """Generar token aleatorio"""
@@ -71,71 +111,63 @@ def generate_token() -> str:
 def get_user_by_email(email: str):
     """Buscar usuario por email"""
     try:
-        if not os.path.exists(USERS_FILE):
-            return None
-            
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['email'].lower() == email.lower():
-                    return row
-    except Exception as e:
-        print(f"❌ Error al leer usuarios: {e}")
+        return user_directory.get(email)
+    except Exception:
+        logger.exception("Error al leer usuarios")
     return None
 
 def save_user(user_data: dict):
     """Guardar nuevo usuario"""
     try:
-        with open(USERS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                user_data['id'],
-                user_data['nombre'],
-                user_data['email'],
-                user_data['password_hash'],
-                user_data['fecha_registro']
-            ])
-        print(f"✅ Usuario guardado: {user_data['email']}")
+        user_directory.add(user_data)
+        logger.debug("Usuario guardado", extra={"email": user_data['email']})
         return True
-    except Exception as e:
-        print(f"❌ Error al guardar usuario: {e}")
+    except Exception:
+        logger.exception("Error al guardar usuario", extra={"email": user_data['email']})
         return False
 
 def save_session(token: str, user_id: str):
     """Guardar sesión"""
     try:
-        with open(SESSIONS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([token, user_id, datetime.now().isoformat()])
-        print(f"✅ Sesión creada")
+        session_store.create(token, user_id)
+        logger.debug("Sesión creada", extra={"user_id": user_id})
         return True
-    except Exception as e:
-        print(f"❌ Error al crear sesión: {e}")
+    except Exception:
+        logger.exception("Error al crear sesión", extra={"user_id": user_id})
         return False
 
+# Al arrancar, y no al importar: los procesos de hashing (spawn) vuelven a
+# importar este archivo y no deben crear archivos ni purgar sesiones
+@app.on_event("startup")
+def startup_event():
+    init_csv_files()
+    session_store.load()
+
 # Endpoints
 @app.get("/")
 def root():
-    print("✅ GET / - OK")
     return {"message": "API de Autenticación funcionando correctamente"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return metrics.response()
+
 @app.post("/api/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def register(user: UserRegister):
-    print(f"\n📝 POST /api/register")
-    print(f"   Nombre: {user.nombre}")
-    print(f"   Email: {user.email}")
+    logger.debug("POST /api/register", extra={"email": user.email, "nombre": user.nombre})
     
     try:
         # Validaciones básicas
         if len(user.nombre) < 3:
-            print("❌ Nombre muy corto")
+            logger.info("Registro rechazado: nombre muy corto", extra={"email": user.email})
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="El nombre debe tener al menos 3 caracteres"
             )
         
         if len(user.password) < 6:
-            print("❌ Contraseña muy corta")
+            logger.info("Registro rechazado: contraseña muy corta", extra={"email": user.email})
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="La contraseña debe tener al menos 6 caracteres"
@@ -144,7 +176,7 @@ def register(user: UserRegister):
         # Verificar si el email ya existe
         existing_user = get_user_by_email(user.email)
         if existing_user:
-            print(f"❌ Email ya registrado: {user.email}")
+            logger.info("Registro rechazado: email ya registrado", extra={"email": user.email})
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="El email ya está registrado"
@@ -178,7 +210,7 @@ def register(user: UserRegister):
                 detail="Error al crear sesión"
             )
         
-        print(f"✅ Usuario registrado exitosamente: {user.email}\n")
+        logger.info("Usuario registrado", extra={"email": user.email, "user_id": user_id})
         
         return UserResponse(
             id=user_id,
@@ -191,10 +223,7 @@ def register(user: UserRegister):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ ERROR INESPERADO: {e}")
-        print(f"   Tipo: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error inesperado en registro", extra={"email": user.email})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error interno del servidor: {str(e)}"
@@ -202,23 +231,22 @@ def register(user: UserRegister):
 
 @app.post("/api/login", response_model=UserResponse)
 def login(credentials: UserLogin):
-    print(f"\n🔐 POST /api/login")
-    print(f"   Email: {credentials.email}")
+    logger.debug("POST /api/login", extra={"email": credentials.email})
     
     try:
         # Buscar usuario
         user = get_user_by_email(credentials.email)
         
         if not user:
-            print(f"❌ Usuario no encontrado")
+            logger.warning("Login fallido: usuario no encontrado", extra={"email": credentials.email})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Credenciales incorrectas"
             )
         
         # Verificar contraseña
-        if not verify_password(credentials.password, user['password_hash']):
-            print(f"❌ Contraseña incorrecta")
+        if not verify_password(user, credentials.password):
+            logger.warning("Login fallido: contraseña incorrecta", extra={"email": credentials.email})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Credenciales incorrectas"
@@ -232,7 +260,7 @@ def login(credentials: UserLogin):
                 detail="Error al crear sesión"
             )
         
-        print(f"✅ Login exitoso: {credentials.email}\n")
+        logger.info("Login exitoso", extra={"email": credentials.email, "user_id": user['id']})
         
         return UserResponse(
             id=user['id'],
@@ -245,9 +273,7 @@ def login(credentials: UserLogin):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ ERROR INESPERADO: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error inesperado en login", extra={"email": credentials.email})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error interno del servidor: {str(e)}"
@@ -255,36 +281,16 @@ def login(credentials: UserLogin):
 
 @app.get("/api/verify")
 def verify_token(token: str):
-    print(f"\n🔍 GET /api/verify")
-    
     try:
-        if not os.path.exists(SESSIONS_FILE):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido"
-            )
-            
-        with open(SESSIONS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['token'] == token:
-                    user_id = row['user_id']
-                    # Buscar el usuario
-                    with open(USERS_FILE, 'r', encoding='utf-8') as uf:
-                        user_reader = csv.DictReader(uf)
-                        for user in user_reader:
-                            if user['id'] == user_id:
-                                print(f"✅ Token válido\n")
-                                return {
-                                    "valid": True,
-                                    "user": {
-                                        "id": user['id'],
-                                        "nombre": user['nombre'],
-                                        "email": user['email']
-                                    }
-                                }
+        user = session_store.verify(token)
+        if user:
+            logger.debug("Token válido", extra={"user_id": user['id']})
+            return {
+                "valid": True,
+                "user": user
+            }
         
-        print(f"❌ Token no encontrado\n")
+        logger.info("Token inválido o expirado")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido o expirado"
@@ -293,9 +299,7 @@ def verify_token(token: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ ERROR INESPERADO: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error inesperado al verificar token")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error interno: {str(e)}"
@@ -309,6 +313,6 @@ if __name__ == "__main__":
     print("📍 URL: http://localhost:8000")
     print("📝 Documentación: http://localhost:8000/docs")
     print("🔒 CORS: Habilitado")
-    print("💾 Almacenamiento: CSV (sin bcrypt)")
+    print("💾 Almacenamiento: CSV (contraseñas con scrypt)")
     print("="*60 + "\n")
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
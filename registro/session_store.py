@@ -0,0 +1,119 @@
+import csv
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from shared.group_commit import GroupCommitWriter
+from shared.metrics import time_storage
+from shared.user_directory import UserDirectory
+
+SESSION_FIELDS = ['token', 'user_id', 'fecha_creacion']
+
+
+class SessionStore:
+    """Sesiones indexadas por token con caducidad y purga periódica del CSV.
+
+    Al iniciar se lee sessions.csv una sola vez; después verificar un token es
+    una búsqueda en diccionario más otra en el directorio de usuarios. Las sesiones
+    vencidas se rechazan al verificarlas y cada `purge_interval` segundos se
+    eliminan de memoria y de sessions.csv.
+    """
+
+    def __init__(self, sessions_path: str, users: UserDirectory,
+                 ttl: timedelta, purge_interval: float = 3600):
+        self.sessions_path = sessions_path
+        self.users = users
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        # token -> (user_id, fecha_creacion)
+        self._sessions: Dict[str, Tuple[str, datetime]] = {}
+        self._last_purge = time.monotonic()
+        self._writer = GroupCommitWriter(sessions_path)
+
+    def load(self):
+        """Carga las sesiones en memoria y purga las vencidas"""
+        with self._lock:
+            self._sessions.clear()
+            if os.path.exists(self.sessions_path):
+                with time_storage('scan', self.sessions_path), open(self.sessions_path, 'r', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        try:
+                            created = datetime.fromisoformat(row['fecha_creacion'])
+                        except ValueError:
+                            continue
+                        self._sessions[row['token']] = (row['user_id'], created)
+
+        self.purge_expired()
+
+    def _expired(self, created: datetime, now: datetime) -> bool:
+        return now - created > self.ttl
+
+    def create(self, token: str, user_id: str):
+        """Guarda la sesión en el índice y la agrega al CSV en lote
+
+        Se indexa antes de escribir para que una purga concurrente, que
+        reescribe el archivo desde memoria, no pierda la sesión.
+        """
+        created = datetime.now()
+        with self._lock:
+            self._sessions[token] = (user_id, created)
+        try:
+            self._writer.write_row([token, user_id, created.isoformat()])
+        except Exception:
+            with self._lock:
+                self._sessions.pop(token, None)
+            raise
+        self._maybe_purge()
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Regresa el usuario dueño del token, o None si no existe o ya venció"""
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+
+        self._maybe_purge()
+        user_id, created = session
+        if self._expired(created, datetime.now()):
+            return None
+
+        user = self.users.get_by_id(user_id)
+        if not user:
+            return None
+        return {
+            'id': user['id'],
+            'nombre': user['nombre'],
+            'email': user['email']
+        }
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Quita las sesiones vencidas de memoria y reescribe sessions.csv
+
+        La reescritura toma el candado del escritor en lote, así que ningún
+        lote se agrega al archivo viejo mientras se reemplaza.
+        """
+        now = datetime.now()
+        with self._lock:
+            self._last_purge = time.monotonic()
+            expired = [token for token, (_, created) in self._sessions.items()
+                       if self._expired(created, now)]
+            for token in expired:
+                del self._sessions[token]
+            if not expired:
+                return 0
+
+            tmp_path = self.sessions_path + '.tmp'
+            with self._writer.exclusive(), time_storage('rewrite', self.sessions_path):
+                with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(SESSION_FIELDS)
+                    for token, (user_id, created) in self._sessions.items():
+                        writer.writerow([token, user_id, created.isoformat()])
+                os.replace(tmp_path, self.sessions_path)
+        return len(expired)
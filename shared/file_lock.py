@@ -0,0 +1,77 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candados entre procesos, solo entre hilos
+    fcntl = None
+
+
+class InterProcessLock:
+    """Candado exclusivo entre hilos y entre procesos para escribir un archivo.
+
+    Usa un candado consultivo (fcntl.flock) sobre `<path>.lock` y no sobre el
+    archivo de datos, porque este se reemplaza con os.replace al compactarlo
+    y un candado sobre el inode viejo ya no protegería al nuevo. Es reentrante
+    dentro del mismo hilo, así que una escritura puede disparar una
+    compactación que vuelve a tomarlo.
+
+    El mismo `.lock` guarda un contador de generación (8 bytes al inicio)
+    que sube cada vez que el archivo de datos se reemplaza. El inode no
+    sirve para notarlo: el sistema de archivos puede reutilizar el del
+    archivo viejo para el nuevo.
+    """
+
+    def __init__(self, path: str):
+        self.lock_path = path + '.lock'
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def _open(self) -> int:
+        if self._fd is None:
+            with self._lock:
+                if self._fd is None:
+                    self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def generation(self) -> int:
+        """Generación actual del archivo de datos (0 si nunca se reemplazó)
+
+        Se puede leer sin el candado; para notar un reemplazo, leerla después
+        de abrir (o hacer `stat` de) el archivo de datos.
+        """
+        fd = self._open()
+        if hasattr(os, 'pread'):
+            data = os.pread(fd, 8, 0)
+        else:  # Windows
+            with self._lock:
+                os.lseek(fd, 0, os.SEEK_SET)
+                data = os.read(fd, 8)
+        return int.from_bytes(data, 'little') if len(data) == 8 else 0
+
+    def bump_generation(self) -> int:
+        """Sube la generación; con el candado tomado y antes de reemplazar el archivo"""
+        generation = self.generation() + 1
+        with self._lock:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            os.write(self._fd, generation.to_bytes(8, 'little'))
+            os.fsync(self._fd)
+        return generation
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                fcntl.flock(self._open(), fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
@@ -0,0 +1,51 @@
+import itertools
+import json
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Cabecera con el cursor de la siguiente página (se pasa como `after`)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def take_page(rows: Iterator[dict], limit: int,
+              cursor_field: str = 'id') -> Tuple[List[dict], Optional[str]]:
+    """Toma hasta `limit` filas y el cursor de la siguiente página, si la hay"""
+    items = list(itertools.islice(rows, limit + 1))
+    if len(items) > limit:
+        items = items[:limit]
+        return items, items[-1][cursor_field]
+    return items, None
+
+
+def ndjson_lines(rows: Iterator[dict]) -> Iterator[bytes]:
+    """Una línea JSON por fila, sin acumular el resultado en memoria"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def listing_response(rows: Iterator[dict], limit: Optional[int], fmt: str = 'json',
+                     envelope: Optional[str] = None) -> Response:
+    """Respuesta de un listado: página JSON o flujo NDJSON, con X-Next-Cursor
+
+    Sin `limit` se devuelve el listado completo, como antes de paginar.
+    `envelope` envuelve la página en un objeto (p. ej. {"products": [...]}).
+    """
+    if fmt == 'ndjson':
+        if limit is None:
+            return StreamingResponse(ndjson_lines(rows), media_type='application/x-ndjson')
+        # La cabecera va antes del cuerpo, así que la página (acotada por
+        # `limit`) se lee completa para saber si hay otra
+        items, next_cursor = take_page(rows, limit)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return StreamingResponse(ndjson_lines(iter(items)), media_type='application/x-ndjson',
+                                 headers=headers)
+
+    if limit is None:
+        items, next_cursor = list(rows), None
+    else:
+        items, next_cursor = take_page(rows, limit)
+
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    content = {envelope: items} if envelope else items
+    return JSONResponse(content=content, headers=headers)
@@ -0,0 +1,170 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from fastapi.responses import PlainTextResponse
+
+# Límites (en segundos) de los buckets de los histogramas, como en Prometheus
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Contador monotónico con etiquetas"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (buckets fijos, suma y conteo)"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # etiquetas -> [conteo por bucket..., +Inf], suma
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, seconds: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[label_values] = series
+            counts, total = series
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            total[0] += seconds
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items())
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+class Metrics:
+    """Métricas del proceso: solicitudes HTTP y operaciones de almacenamiento"""
+
+    def __init__(self):
+        self.requests_total = Counter(
+            "http_requests_total", "Solicitudes HTTP atendidas",
+            ("method", "route", "status")
+        )
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Latencia de las solicitudes HTTP",
+            ("method", "route")
+        )
+        self.storage_duration = Histogram(
+            "storage_operation_duration_seconds",
+            "Duración de operaciones de almacenamiento (lecturas, agregados, reescrituras)",
+            ("operation", "target")
+        )
+
+    @contextmanager
+    def time_storage(self, operation: str, target: str):
+        """Mide una operación de almacenamiento; `target` es el archivo o la tabla"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.storage_duration.observe(time.perf_counter() - started, operation, os.path.basename(target))
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests_total, self.request_duration, self.storage_duration):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def response(self) -> PlainTextResponse:
+        return PlainTextResponse(self.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Registro compartido por los almacenes y el middleware del proceso
+metrics = Metrics()
+
+
+def time_storage(operation: str, target: str):
+    return metrics.time_storage(operation, target)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que cuenta y mide cada solicitud HTTP por ruta y código
+
+    La ruta es la plantilla de FastAPI (p. ej. /reservations/{court_id}/{date})
+    para que los ids no creen una serie por valor; lo que no coincide con
+    ninguna ruta se agrupa como "unmatched".
+    """
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            self.registry.request_duration.observe(time.perf_counter() - started, method, path)
+            self.registry.requests_total.inc(method, path, str(status_code))
@@ -0,0 +1,144 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+# Costo de scrypt: N (CPU/memoria, potencia de 2), r (bloque) y p (paralelismo)
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+# Procesos para calcular hashes; 0 = calcular en el hilo que llama
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+SCRYPT_PREFIX = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt usa 128 * r * n bytes; se deja margen sobre el límite de 32 MB de hashlib
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n, dklen=KEY_BYTES)
+
+
+def hash_password(password: str, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> str:
+    """Hash con sal en formato scrypt$N$r$p$sal$clave"""
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f"{SCRYPT_PREFIX}${n}${r}${p}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def legacy_hash(password: str) -> str:
+    """Hash anterior: SHA-256 sin sal"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Compara la contraseña con un hash scrypt o con uno SHA-256 anterior"""
+    if stored.startswith(SCRYPT_PREFIX + "$"):
+        try:
+            _, n, r, p, salt, key = stored.split("$")
+            expected = base64.b64decode(key)
+            actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+    return hmac.compare_digest(legacy_hash(password), stored)
+
+
+def needs_rehash(stored: str, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> bool:
+    """True si el hash es SHA-256 o scrypt con un costo distinto al actual"""
+    return not stored.startswith(f"{SCRYPT_PREFIX}${n}${r}${p}$")
+
+
+def check_password(password: str, stored: str, n: int = SCRYPT_N, r: int = SCRYPT_R,
+                   p: int = SCRYPT_P) -> Tuple[bool, Optional[str]]:
+    """Verifica la contraseña y, si el hash está desactualizado, calcula el nuevo
+
+    Regresa (válida, nuevo_hash); nuevo_hash es None si no hay que actualizar.
+    Todo ocurre en una sola tarea para no pagar dos viajes al pool.
+    """
+    if not verify_password(password, stored):
+        return False, None
+    if needs_rehash(stored, n, r, p):
+        return True, hash_password(password, n, r, p)
+    return True, None
+
+
+def _warm_up() -> None:
+    pass
+
+
+class PasswordHasher:
+    """Calcula y verifica hashes de contraseñas en un pool de procesos.
+
+    scrypt ocupa la CPU por completo durante decenas de milisegundos; en un
+    pool de procesos los logins concurrentes se reparten entre los núcleos en
+    lugar de turnarse el GIL y de bloquear el event loop. Los procesos se
+    crean con "spawn" para no heredar los hilos ni los locks del servidor.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, n: int = SCRYPT_N,
+                 r: int = SCRYPT_R, p: int = SCRYPT_P):
+        self.workers = workers
+        self.params = (n, r, p)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def start(self):
+        """Arranca los procesos de antemano para que el primer login no espere"""
+        pool = self._pool()
+        if pool is not None:
+            for future in [pool.submit(_warm_up) for _ in range(self.workers)]:
+                future.result()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, *self.params)
+
+    async def check(self, password: str, stored: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(check_password, password, stored, *self.params)
+
+    def hash_blocking(self, password: str) -> str:
+        """Versión para handlers síncronos (corren en el pool de hilos de FastAPI)"""
+        return self._call(hash_password, password, *self.params)
+
+    def check_blocking(self, password: str, stored: str) -> Tuple[bool, Optional[str]]:
+        return self._call(check_password, password, stored, *self.params)
+
+    async def _run(self, func, *args):
+        pool = self._pool()
+        if pool is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+    def _call(self, func, *args):
+        pool = self._pool()
+        if pool is None:
+            return func(*args)
+        return pool.submit(func, *args).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,179 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Nivel mínimo y muestreo por nivel, p. ej. LOG_SAMPLING="DEBUG=0.01,INFO=0.1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# Registros en espera de escribirse; si la cola se llena se descartan
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Id de la solicitud en curso; FastAPI lo propaga a los handlers síncronos
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+# Atributos propios de LogRecord; lo demás que llegue en `extra` va al JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+def parse_sampling(text: str) -> Dict[int, float]:
+    """Convierte "DEBUG=0.01,INFO=0.1" en {nivel: fracción que se conserva}"""
+    rates = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, rate = part.partition("=")
+        rates[logging.getLevelName(name.strip().upper())] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Conserva solo una fracción de los registros de cada nivel
+
+    Los niveles sin tasa configurada se conservan completos, así que
+    WARNING y ERROR no se pierden salvo que se pida explícitamente.
+    """
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        return rate is None or (rate > 0 and random.random() < rate)
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con el id de la solicitud y los campos de `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", ""):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Encola el registro sin formatearlo y sin bloquear si la cola está llena
+
+    El hilo que escribe (`listener`) arranca con el primer registro.
+    """
+
+    def __init__(self, log_queue: queue.Queue, listener: logging.handlers.QueueListener):
+        super().__init__(log_queue)
+        self.listener = listener
+        self.dropped = 0
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El id se lee aquí, en el hilo de la solicitud; el JSON se arma en el listener
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            # El traceback no se puede pasar entre hilos de forma segura; solo ocurre en errores
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if not self._started:
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_listener(self):
+        with self._start_lock:
+            if not self._started:
+                self.listener.start()
+                atexit.register(self.listener.stop)
+                self._started = True
+
+
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+def get_logger(name: str, stream=None) -> logging.Logger:
+    """Logger que escribe JSON desde un hilo de fondo
+
+    Las llamadas a `logger.info(...)` solo aplican el muestreo y encolan el
+    registro; un QueueListener lo serializa y lo escribe en `stream`
+    (stdout por defecto), fuera del camino de la solicitud. El hilo arranca
+    con el primer registro, así que un proceso que solo importa el módulo
+    (p. ej. un proceso de hashing creado con spawn) no lo crea.
+    """
+    logger = logging.getLogger(name)
+    if name in _listeners:
+        return logger
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, output)
+    _listeners[name] = listener
+
+    handler = _QueueHandler(log_queue, listener)
+    handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    return logger
+
+
+class RequestIdMiddleware:
+    """Asigna un id a cada solicitud (o usa el de la cabecera X-Request-ID)
+
+    El id queda en `request_id_var` para los registros de esa solicitud y se
+    devuelve en la misma cabecera para correlacionar cliente y servidor.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._header = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id: Optional[str] = None
+        for name, value in scope["headers"]:
+            if name == self._header:
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self._header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,244 @@
+import csv
+import io
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from shared.group_commit import DEFAULT_FSYNC, GroupCommitWriter
+from shared.metrics import time_storage
+
+
+def normalize_email(email: str) -> str:
+    """Forma canónica del correo para comparar sin importar mayúsculas"""
+    return email.strip().lower()
+
+
+class DuplicateEmailError(Exception):
+    """Ya hay un usuario con ese correo (sin importar mayúsculas)"""
+
+    def __init__(self, email: str):
+        super().__init__(f"El correo {email} ya está registrado")
+        self.email = email
+
+
+def read_tail(path: str, offset: int, header: List[str]) -> Tuple[int, List[str], List[dict]]:
+    """Filas completas de un CSV a partir de `offset`: (nuevo offset, encabezado, filas)
+
+    Con `offset` 0 la primera línea es el encabezado. Una línea a medio
+    escribir por otro proceso se deja para la siguiente lectura.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return offset, header, []
+
+    reader = csv.reader(io.StringIO(data[:end].decode('utf-8'), newline=''))
+    if offset == 0:
+        header = next(reader, None) or header
+    return offset + end, header, [dict(zip(header, values)) for values in reader if values]
+
+
+class UserDirectory:
+    """Índice en memoria de users.csv por correo normalizado (y por id si existe).
+
+    El archivo se lee completo una vez; después solo se leen los bytes que
+    otro proceso haya agregado al final, detectados por tamaño y fecha de
+    modificación. Si el archivo se reemplaza (otro inode) o se acorta se
+    recarga completo.
+
+    Las modificaciones no reescriben users.csv: la fila ya modificada se
+    agrega a `updates_path` (por omisión `<users>_updates.csv`) y al leer
+    gana la última de cada correo. Así users.csv solo crece y quien lo lee
+    por el final (p. ej. el conteo de usuarios) no tiene que recontarlo.
+
+    Con `shared=True` varios procesos (workers) dan de alta usuarios en el
+    mismo archivo: cada alta revisa el correo y escribe bajo el candado del
+    archivo, después de leer lo que hayan agregado los demás.
+    """
+
+    def __init__(self, path: str, fieldnames: List[str], updates_path: Optional[str] = None,
+                 shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self.updates_path = updates_path or os.path.splitext(path)[0] + '_updates.csv'
+        self.fieldnames = fieldnames
+        self._lock = threading.RLock()
+        self._header: List[str] = list(fieldnames)
+        self._rows: List[dict] = []
+        self._by_email: Dict[str, dict] = {}
+        self._by_id: Dict[str, dict] = {}
+        # id -> posición en _rows (para paginar con cursor)
+        self._position: Dict[str, int] = {}
+        self._offset = 0
+        self._updates_header: List[str] = list(fieldnames)
+        self._updates_offset = 0
+        # Firma de users.csv y del log de modificaciones en la última lectura
+        self._signature: Tuple[Optional[Tuple[int, int, int]], ...] = (None, None)
+        # Correos con un alta en curso (aún no están en el archivo)
+        self._adding = set()
+        self._writer = GroupCommitWriter(path)
+        self._updates_writer = GroupCommitWriter(self.updates_path)
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Sincroniza el índice con los archivos si cambiaron desde la última lectura"""
+        signature = (self._stat(self.path), self._stat(self.updates_path))
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            signature = (self._stat(self.path), self._stat(self.updates_path))
+            if signature == self._signature:
+                return
+            offsets = (self._offset, self._updates_offset)
+            for current, previous, offset in zip(signature, self._signature, offsets):
+                if previous is not None and (current is None or current[0] != previous[0] or current[2] < offset):
+                    self._reset()
+                    break
+            with time_storage('scan', self.path):
+                # Primero el log: toda modificación leída aquí es de una fila
+                # que ya estaba en users.csv, y users.csv se lee después
+                updates = []
+                if signature[1] is not None:
+                    self._updates_offset, self._updates_header, updates = read_tail(
+                        self.updates_path, self._updates_offset, self._updates_header)
+                if signature[0] is not None:
+                    self._offset, self._header, rows = read_tail(self.path, self._offset, self._header)
+                    for row in rows:
+                        self._index(row)
+                for row in updates:
+                    self._apply_update(row)
+            self._signature = signature
+
+    def _reset(self):
+        self._header = list(self.fieldnames)
+        self._rows = []
+        self._by_email = {}
+        self._by_id = {}
+        self._position = {}
+        self._offset = 0
+        self._updates_header = list(self.fieldnames)
+        self._updates_offset = 0
+
+    def _index(self, row: dict):
+        self._rows.append(row)
+        # Si hay correos repetidos gana el primero, igual que la búsqueda lineal
+        self._by_email.setdefault(normalize_email(row.get('email', '')), row)
+        if 'id' in row:
+            self._by_id.setdefault(row['id'], row)
+            self._position.setdefault(row['id'], len(self._rows) - 1)
+
+    def _apply_update(self, updated: dict):
+        # Se modifica la fila en su lugar: el usuario conserva su posición
+        row = self._by_email.get(normalize_email(updated.get('email', '')))
+        if row is not None:
+            row.update(updated)
+
+    def get(self, email: str) -> Optional[dict]:
+        """Busca un usuario por correo"""
+        self._refresh()
+        row = self._by_email.get(normalize_email(email))
+        return dict(row) if row else None
+
+    def get_by_id(self, user_id: str) -> Optional[dict]:
+        """Busca un usuario por id"""
+        self._refresh()
+        row = self._by_id.get(user_id)
+        return dict(row) if row else None
+
+    def exists(self, email: str) -> bool:
+        self._refresh()
+        return normalize_email(email) in self._by_email
+
+    def all(self) -> List[dict]:
+        """Todos los usuarios en el orden del archivo"""
+        self._refresh()
+        with self._lock:
+            return [dict(row) for row in self._rows]
+
+    def query(self, after: Optional[str] = None) -> Iterator[dict]:
+        """Recorre los usuarios en orden a partir del id `after` (KeyError si no existe)"""
+        self._refresh()
+        rows = self._rows
+        start = self._position[after] + 1 if after is not None else 0
+        return (dict(rows[i]) for i in range(start, len(rows)))
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._rows)
+
+    def add(self, user_data: dict):
+        """Agrega el usuario al final del CSV y al índice si su correo no existe
+
+        Lanza DuplicateEmailError si el correo ya está registrado o lo está
+        registrando otra solicitud: la revisión y el apartado del correo se
+        hacen juntos bajo el candado. La fila se escribe en lote con las de
+        otras solicitudes concurrentes; al regresar ya está en el archivo y
+        la lectura incremental la indexa.
+        """
+        email = normalize_email(user_data['email'])
+        values = [user_data[field] for field in self.fieldnames]
+        if self.shared:
+            self._add_shared(email, user_data['email'], values)
+            return
+
+        with self._lock:
+            self._refresh()
+            if email in self._by_email or email in self._adding:
+                raise DuplicateEmailError(user_data['email'])
+            self._adding.add(email)
+        try:
+            self._writer.write_row(values)
+            self._refresh()
+        finally:
+            with self._lock:
+                self._adding.discard(email)
+
+    def _add_shared(self, email: str, original_email: str, values: list):
+        """Alta en modo compartido: revisa y escribe bajo el candado entre procesos, sin lote"""
+        with self._lock, self._writer.exclusive():
+            self._refresh()
+            if email in self._by_email:
+                raise DuplicateEmailError(original_email)
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(values)
+            with time_storage('append', self.path), open(self.path, 'a', newline='', encoding='utf-8') as f:
+                f.write(buffer.getvalue())
+                if DEFAULT_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._refresh()
+
+    def update(self, email: str, changes: dict) -> bool:
+        """Modifica campos de un usuario; False si no existe
+
+        Agrega la fila modificada al log de modificaciones (en lote, como las
+        altas) sin tocar users.csv, así que cuesta lo mismo con muchos
+        usuarios, p. ej. al actualizar el formato del hash de la contraseña de
+        todos los que inician sesión tras un despliegue.
+        """
+        self._refresh()
+        with self._lock:
+            row = self._by_email.get(normalize_email(email))
+            if row is None:
+                return False
+            updated = dict(row, **changes)
+            header = self._header
+
+        with self._updates_writer.exclusive():
+            if not os.path.exists(self.updates_path) or os.path.getsize(self.updates_path) == 0:
+                with open(self.updates_path, 'a', newline='', encoding='utf-8') as f:
+                    csv.writer(f).writerow(header)
+        self._updates_writer.write_row([updated.get(field, '') for field in header])
+        self._refresh()
+        return True